@@ -1,21 +1,297 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, g, stream_with_context
+from markupsafe import Markup
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import generate_password_hash
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import and_, or_, func, insert, select, event, text, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from datetime import datetime, timedelta
+from migrations import run_migrations
+from database import (
+    database_url, engine_options, sqlite_pragmas_from_env, install_sqlite_pragmas,
+    incremental_vacuum, enable_incremental_vacuum
+)
+from backplane import LocalManager
+from persistence import WriteBehindQueue
+from recent import RecentMessages
+from cache import TTLCache
+from assets import init_assets
+from compression import init_compression
+from presence import PresenceRegistry
+from coalesce import Coalescer
+from ratelimit import parse_limits, create_rate_limiter
+from metrics import Registry
+from profiling import SamplingProfiler
+from logconfig import configure_logging, parse_levels
+from archive import ArchiveStore, parse_retention
+from hashing import PasswordHasher, HasherBusy
+from functools import wraps
+import atexit
+import csv
+import hashlib
+import io
+import json
+import logging
+import secrets
+import click
+import threading
+import time
 import os
+import re
 import string
-import random
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; run a single worker there
+    fcntl = None
+
+# Logging - JSON lines written by a background thread. LOG_LEVELS sets levels
+# per subsystem as "http=info,socket=warning,db=warning"; per-packet Socket.IO
+# logs (socket=info) are sampled at LOG_PACKET_SAMPLE.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = parse_levels(os.environ.get('LOG_LEVELS'), {'http': logging.INFO, 'socket': logging.INFO, 'db': logging.WARNING})
+LOG_PACKET_SAMPLE = float(os.environ.get('LOG_PACKET_SAMPLE', 0.01))
+configure_logging(LOG_LEVEL, LOG_LEVELS, LOG_PACKET_SAMPLE)
+
+http_log = logging.getLogger('chat.http')
+socket_log = logging.getLogger('chat.socket')
+db_log = logging.getLogger('chat.db')
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-change-this')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///chat_app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Templates are compiled once and kept; static files may be cached by browsers
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.environ.get('STATIC_MAX_AGE', 86400))
+
+# Fingerprinted, precompressed static files under /assets/ - templates link them with asset_url()
+assets = init_assets(app)
+
+# gzip/brotli for HTML and JSON responses, negotiated per request
+init_compression(app)
+
+# Pool settings come from DB_POOL_*; SQLite pragmas are set on every pooled connection at creation
+SQLITE_PRAGMAS = sqlite_pragmas_from_env()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], SQLITE_PRAGMAS)
+
+# Chat history paging - only the latest page is rendered, older pages load on demand
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 50))
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Chat messages are broadcast first and committed in batches by a background
+# writer; MESSAGE_WRITE_BEHIND=0 restores one commit per message
+MESSAGE_WRITE_BEHIND = os.environ.get('MESSAGE_WRITE_BEHIND', '1') == '1'
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 100))
+WRITE_BEHIND_INTERVAL_MS = int(os.environ.get('WRITE_BEHIND_INTERVAL_MS', 5))
+WRITE_BEHIND_RETRIES = int(os.environ.get('WRITE_BEHIND_RETRIES', 5))
+WRITE_BEHIND_BACKOFF_MS = int(os.environ.get('WRITE_BEHIND_BACKOFF_MS', 50))
+
+# Socket.IO backplane - with several workers, emits must go through a shared
+# message queue (redis://, amqp://, kafka://, zmq+tcp://) to reach sockets held
+# by other processes. local:// is an in-process stand-in for tests.
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'flask-socketio')
+# Without sticky sessions the polling transport breaks across workers, so
+# clients can be told to connect with WebSocket only
+SOCKETIO_WEBSOCKET_ONLY = os.environ.get('SOCKETIO_WEBSOCKET_ONLY', '0') == '1'
+
+# Newest messages per room are kept in memory so page opens and rejoins skip
+# the database. Each worker only sees its own sockets' messages, so the cache
+# is off by default once a message queue spreads rooms across workers.
+RECENT_CACHE = os.environ.get('RECENT_CACHE', '0' if SOCKETIO_MESSAGE_QUEUE else '1') == '1'
+RECENT_CACHE_ROOMS = int(os.environ.get('RECENT_CACHE_ROOMS', 1000))
+RECENT_CACHE_MAX_BYTES = int(os.environ.get('RECENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Retention (opt-in) - messages older than their room's policy are moved into
+# gzip NDJSON segments under ARCHIVE_DIR (one per batch, by room and month)
+# and deleted from the live table. RETENTION_POLICY overrides RETENTION_DAYS
+# per category or room code, e.g. "custom=30,ABCD1234=7". Compaction runs
+# every RETENTION_INTERVAL seconds in the server, or on demand with `flask
+# compact`; a lock file in ARCHIVE_DIR keeps it to one process at a time.
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 0))
+RETENTION_POLICY = parse_retention(os.environ.get('RETENTION_POLICY'), RETENTION_DAYS)
+RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 0))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(app.instance_path, 'archive'))
+COMPACTION_BATCH_SIZE = 1000
+
+def socketio_queue_options(url, channel):
+    if not url:
+        return {}
+    if url.startswith('local://'):
+        return {'client_manager': LocalManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
+
+# Logged-in users are cached so load_user does not SELECT on every request
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 4096))
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+
+# Token-bucket limits per event as "name=rate_per_sec:burst,..." - socket
+# events are keyed by user, /login by client address. RATE_LIMIT_STORAGE set
+# to a redis:// URL shares the buckets between workers.
+DEFAULT_RATE_LIMITS = {
+    'message': (5, 20),
+    'join': (1, 10),
+    'history': (5, 20),
+    'create_room': (0.1, 5),
+    'login': (0.2, 10),
+    'export': (0.05, 3)
+}
+RATE_LIMITS = parse_limits(os.environ.get('RATE_LIMITS'), DEFAULT_RATE_LIMITS)
+rate_limiter = create_rate_limiter(os.environ.get('RATE_LIMIT_STORAGE'), RATE_LIMITS)
+
+# Number of reverse proxies in front of the app (nginx in deploy/ is one).
+# Their X-Forwarded-For/-Proto headers then give the client address that
+# /login is limited by; with 0 the headers are ignored, as anyone can send them.
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+# Password hashing runs on its own bounded pool - PASSWORD_HASH_WORKERS at a
+# time, PASSWORD_HASH_QUEUE waiting, and /login and /register answer 503 when
+# both are full. Every running or waiting hash holds a request thread, so by
+# default the two together stay below GUNICORN_THREADS, leaving at least one
+# thread per worker for everything else. PASSWORD_HASH_METHOD sets the
+# algorithm and work factor for new hashes, e.g. "scrypt:32768:8:1".
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))
+REQUEST_THREADS = int(os.environ.get('GUNICORN_THREADS', 2))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', max(REQUEST_THREADS - PASSWORD_HASH_WORKERS - 1, 0)))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 2))
+
+password_hasher = PasswordHasher(
+    method=PASSWORD_HASH_METHOD,
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_QUEUE,
+    timeout=PASSWORD_HASH_TIMEOUT
+)
 
 # Initialize extensions - THREADING MODE ONLY
 db = SQLAlchemy(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', logger=True)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode='threading',
+    logger=logging.getLogger('socketio.server'),
+    engineio_logger=logging.getLogger('engineio.server'),
+    **socketio_queue_options(SOCKETIO_MESSAGE_QUEUE, SOCKETIO_CHANNEL)
+)
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
+# Prometheus metrics, served as text from /metrics. Queries are attributed to
+# the HTTP endpoint or socket event running on the thread, else 'background'.
+# /metrics* answer "Authorization: Bearer <METRICS_TOKEN>" when a token is
+# set, and only loopback clients when it is not.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+LOOPBACK_ADDRESSES = {'127.0.0.1', '::1'}
+
+metrics = Registry()
+http_requests = metrics.counter('http_requests_total', 'HTTP requests handled.', ['endpoint', 'method', 'status'])
+http_latency = metrics.histogram('http_request_duration_seconds', 'HTTP request latency.', ['endpoint'])
+socket_events = metrics.counter('socketio_events_total', 'Socket.IO events handled.', ['event'])
+socket_latency = metrics.histogram('socketio_event_duration_seconds', 'Socket.IO event handler latency.', ['event'])
+db_queries = metrics.counter('db_queries_total', 'SQL statements executed.', ['route'])
+db_latency = metrics.histogram('db_query_duration_seconds', 'SQL statement latency.', ['route'])
+messages_received = metrics.counter('chat_messages_received_total', 'Chat messages received from sockets.')
+messages_broadcast = metrics.counter('chat_messages_broadcast_total', 'Chat messages broadcast to rooms.', ['mode'])
+commit_latency = metrics.histogram('chat_message_commit_seconds', 'Time to commit chat messages.', ['mode'])
+rate_limited_events = metrics.counter('rate_limited_total', 'Events and requests rejected by rate limits.', ['event'])
+metrics.gauge('password_hash_in_flight', 'Password hashes running or queued.',
+              collect=lambda: password_hasher.stats()['in_flight'])
+metrics.counter('password_hash_total', 'Password hashes finished or turned away.', ['result'],
+                collect=lambda: {(key,): value for key, value in password_hasher.stats().items() if key != 'in_flight'})
+
+metrics_scope = threading.local()
+
+# Profiling (opt-in) - PROFILE_MODE=header samples requests, and the events of
+# sockets, that send "X-Profile: <PROFILE_TOKEN>" and always writes them;
+# PROFILE_MODE=all samples everything and writes runs slower than
+# PROFILE_SLOW_MS. Output goes to PROFILE_DIR as collapsed stacks + SQL.
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'off')
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_SLOW_MS = int(os.environ.get('PROFILE_SLOW_MS', 200))
+PROFILE_INTERVAL_MS = int(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+profiler = None
+if PROFILE_MODE in ('header', 'all'):
+    profiler = SamplingProfiler(
+        PROFILE_DIR,
+        interval=PROFILE_INTERVAL_MS / 1000,
+        slow=PROFILE_SLOW_MS / 1000
+    )
+
+def start_profile(kind, name):
+    if profiler is None:
+        return None
+    token = request.headers.get('X-Profile')
+    requested = bool(PROFILE_TOKEN and token) and secrets.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+    if requested or PROFILE_MODE == 'all':
+        return profiler.start(kind, name, keep=requested)
+    return None
+
+def metrics_route():
+    return getattr(metrics_scope, 'route', None) or 'background'
+
+# The start time lives on the statement's execution context, which is simply
+# dropped when the statement fails
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    route = metrics_route()
+    db_queries.inc(route)
+    db_latency.observe(elapsed, route)
+    if profiler:
+        profiler.record_query(statement, elapsed)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics_scope.route = request.endpoint or 'unmatched'
+    g.profile = start_profile('http', metrics_scope.route)
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    http_requests.inc(endpoint, request.method, str(response.status_code))
+    if 'request_started' in g:
+        http_latency.observe(time.perf_counter() - g.request_started, endpoint)
+    return response
+
+@app.teardown_request
+def end_request_scope(exc):
+    metrics_scope.route = None
+    profile = g.pop('profile', None)
+    if profile:
+        profiler.stop(profile)
+
+def instrumented(event_name):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            route = f'socket:{event_name}'
+            metrics_scope.route = route
+            profile = start_profile('socket', event_name)
+            started = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                socket_events.inc(event_name)
+                socket_latency.observe(time.perf_counter() - started, event_name)
+                metrics_scope.route = None
+                if profile:
+                    profiler.stop(profile)
+        return wrapper
+    return decorator
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -23,11 +299,11 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # Database Models
-class User(db.Model):
+class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
-    password = db.Column(db.String(100), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     verification_code = db.Column(db.String(10), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -39,33 +315,538 @@ class ChatRoom(db.Model):
     is_public = db.Column(db.Boolean, default=False)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_chat_room_category_public', 'category', 'is_public'),
+        db.Index('ix_chat_room_name_category', 'name', 'category'),
+    )
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    room_code = db.Column(db.String(8), nullable=False)
+    room_code = db.Column(db.String(8), db.ForeignKey('chat_room.code'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref='messages')
+    
+    # Serves room history: equality on room_code, keyset on (timestamp, id)
+    __table_args__ = (
+        db.Index('ix_message_room_timestamp_id', 'room_code', 'timestamp', 'id'),
+    )
+
+# Detached, read-only view of a User that is safe to share between requests
+# and threads. It carries only what pages and socket handlers read.
+class UserSnapshot(UserMixin):
+    def __init__(self, user):
+        self.id = user.id
+        self.name = user.name
+        self.email = user.email
+        self.verification_code = user.verification_code
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Flush only records the changed users; they leave the cache once the
+# change is committed, so a concurrent login cannot re-cache the old row
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def mark_user_stale(mapper, connection, target):
+    inspect(target).session.info.setdefault('stale_users', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_cached_users(session):
+    for user_id in session.info.pop('stale_users', ()):
+        user_cache.pop(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_stale_users(session):
+    session.info.pop('stale_users', None)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-def generate_room_code():
-    chars = string.ascii_uppercase + string.digits
-    code = ''.join(random.choices(chars, k=8))
-    while ChatRoom.query.filter_by(code=code).first():
-        code = ''.join(random.choices(chars, k=8))
-    return code
-
-def generate_verification_code():
-    chars = string.ascii_uppercase + string.digits
-    code = ''.join(random.choices(chars, k=10))
-    while User.query.filter_by(verification_code=code).first():
-        code = ''.join(random.choices(chars, k=10))
-    return code
+    user_id = int(user_id)
+    user = user_cache.get(user_id)
+    if user is None:
+        row = db.session.get(User, user_id)
+        if row is None:
+            return None
+        user = UserSnapshot(row)
+        user_cache.set(user_id, user)
+    return user
+
+# Socket sessions pin the user resolved at connect, so event handlers never
+# go back through Flask-Login (and the User table) per event
+socket_users = {}
+
+def socket_user():
+    return socket_users.get(request.sid)
+
+# Rejected socket events return a small ack instead of running the handler
+def rate_limited(event_name):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            user = socket_user()
+            if not rate_limiter.allow(event_name, user.id if user else request.sid):
+                rate_limited_events.inc(event_name)
+                socket_log.info('rate limited', extra={'event': event_name, 'sid': request.sid})
+                return {'error': 'rate_limited', 'event': event_name}
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def rate_limited_route(name, key=None, methods=('POST',)):
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if request.method in methods and not rate_limiter.allow(name, key() if key else request.remote_addr):
+                rate_limited_events.inc(name)
+                http_log.info('rate limited', extra={'event': name, 'remote_addr': request.remote_addr})
+                return render_template(
+                    'notice.html',
+                    kind='warning',
+                    heading='⏳ Too many requests',
+                    text='Please wait a moment and try again.',
+                    links=[('← Back', request.referrer or url_for('index'), 'warning')]
+                ), 429
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Room and verification codes are drawn from a CSPRNG and inserted without
+# checking first - at 36^8 / 36^10 possible codes a clash is rare enough that
+# the unique index is the check, and a clash only costs a retry
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+ROOM_CODE_LENGTH = 8
+VERIFICATION_CODE_LENGTH = 10
+CODE_ATTEMPTS = 5
+
+def generate_code(length):
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+def add_with_code(build, column, length):
+    """Add build(code) to the session and flush it under a fresh unique code.
+
+    A duplicate code rolls back the session's transaction and tries again, so
+    call this before adding anything else that should be committed with it.
+    Other integrity errors are raised as usual.
+    """
+    for _ in range(CODE_ATTEMPTS):
+        obj = build(generate_code(length))
+        db.session.add(obj)
+        try:
+            db.session.flush()
+            return obj
+        except IntegrityError as e:
+            db.session.rollback()
+            if column not in str(e.orig):
+                raise
+    raise RuntimeError(f'no unique {column} after {CODE_ATTEMPTS} attempts')
+
+# History cursors are "<timestamp>_<id>" so pages are fetched with a keyset
+# on (timestamp, id) instead of OFFSET
+def encode_cursor(timestamp, message_id):
+    return f"{timestamp.isoformat()}_{message_id}"
+
+def decode_cursor(cursor):
+    try:
+        timestamp, message_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (AttributeError, ValueError):
+        return None
+
+def older_than(query, before):
+    timestamp, message_id = before
+    return query.filter(or_(
+        Message.timestamp < timestamp,
+        and_(Message.timestamp == timestamp, Message.id < message_id)
+    ))
+
+def load_history(room_code, before=None, limit=HISTORY_PAGE_SIZE):
+    # Authors come in with the same SELECT so rendering never lazy-loads msg.user
+    query = Message.query.options(joinedload(Message.user)).filter_by(room_code=room_code)
+    if before:
+        query = older_than(query, before)
+    
+    # Fetch one extra row to know whether an older page exists
+    page = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+    page.reverse()
+    
+    next_cursor = encode_cursor(page[0].timestamp, page[0].id) if has_more else None
+    return page, next_cursor
+
+def serialize_message(msg):
+    return {
+        'id': msg.id,
+        'message': msg.content,
+        'username': msg.user.name,
+        'verification_code': msg.user.verification_code,
+        'timestamp': msg.timestamp.strftime('%H:%M'),
+        'cursor': encode_cursor(msg.timestamp, msg.id)
+    }
+
+archive = ArchiveStore(ARCHIVE_DIR)
+
+def serialize_archived(row):
+    timestamp = datetime.fromisoformat(row['timestamp'])
+    return {
+        'id': row['id'],
+        'message': row['content'],
+        'username': row['username'],
+        'verification_code': row['verification_code'],
+        'timestamp': timestamp.strftime('%H:%M'),
+        'cursor': encode_cursor(timestamp, row['id'])
+    }
+
+def with_archive(room_code, messages, next_cursor, limit, before=None):
+    # Archived rows are all older than the live table, so a page that ran out
+    # of live rows continues into the room's archive segments
+    if next_cursor or not archive.has_room(room_code):
+        return messages, next_cursor
+    bound = decode_cursor(messages[0]['cursor']) if messages else before
+    older, has_more = archive.page(room_code, bound, limit - len(messages))
+    messages = [serialize_archived(row) for row in older] + messages
+    return messages, messages[0]['cursor'] if has_more and messages else None
+
+def history_page(room_code, before=None, limit=None):
+    cursor = None
+    if before:
+        cursor = decode_cursor(before)
+        if not cursor:
+            return None
+    elif not limit:
+        messages, next_cursor = latest_history(room_code)
+        return {'room': room_code, 'messages': messages, 'next_cursor': next_cursor}
+    
+    try:
+        limit = min(max(int(limit or HISTORY_PAGE_SIZE), 1), HISTORY_MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        limit = HISTORY_PAGE_SIZE
+    messages, next_cursor = load_history(room_code, before=cursor, limit=limit)
+    messages, next_cursor = with_archive(
+        room_code, [serialize_message(msg) for msg in messages], next_cursor, limit, before=cursor
+    )
+    return {'room': room_code, 'messages': messages, 'next_cursor': next_cursor}
+
+# Search - on SQLite the message_fts index (see migrations.py) finds matches
+# inside the room, ranked by bm25. bm25 scores shift with every message added
+# anywhere, so they cannot serve as a cursor: the first page pins the match set
+# to the messages that existed then, and later pages are offsets into its
+# ranking, up to SEARCH_MAX_RESULTS. Other backends fall back to LIKE over the
+# room's messages, newest first, paged like history.
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', 500))
+SEARCH_MAX_TERMS = 16
+
+def search_terms(query):
+    return re.findall(r'\w+', query or '')[:SEARCH_MAX_TERMS]
+
+def decode_search_cursor(cursor):
+    try:
+        snapshot, offset = cursor.split('_')
+        return int(snapshot), int(offset)
+    except (AttributeError, ValueError):
+        return None
+
+def fts_search(room_code, terms, after=None, limit=SEARCH_PAGE_SIZE):
+    # Every term must match; the last one also matches as a prefix
+    quoted = ' '.join(f'"{term}"' for term in terms)
+    room = room_code.replace('"', '""')
+    if after:
+        snapshot, offset = after
+    else:
+        snapshot, offset = db.session.execute(select(func.max(Message.id))).scalar() or 0, 0
+    limit = min(limit, SEARCH_MAX_RESULTS - offset)
+    if limit <= 0:
+        return [], None
+    hits = db.session.execute(text(
+        'SELECT rowid FROM message_fts WHERE message_fts MATCH :match AND rowid <= :snapshot '
+        'ORDER BY rank, rowid LIMIT :limit OFFSET :offset'
+    ), {
+        'match': f'room_code:"{room}" AND content:({quoted}*)',
+        'snapshot': snapshot,
+        'limit': limit + 1,
+        'offset': offset
+    }).scalars().all()
+    has_more = len(hits) > limit and offset + limit < SEARCH_MAX_RESULTS
+    hits = hits[:limit]
+    
+    found = Message.query.options(joinedload(Message.user)).filter(Message.id.in_(hits)).all()
+    by_id = {msg.id: msg for msg in found}
+    messages = [by_id[hit] for hit in hits if hit in by_id]
+    next_cursor = f"{snapshot}_{offset + limit}" if has_more else None
+    return messages, next_cursor
+
+def like_search(room_code, terms, before=None, limit=SEARCH_PAGE_SIZE):
+    query = Message.query.options(joinedload(Message.user)).filter_by(room_code=room_code)
+    for term in terms:
+        pattern = term.replace('_', r'\_')
+        query = query.filter(Message.content.ilike(f'%{pattern}%', escape='\\'))
+    if before:
+        query = older_than(query, before)
+    page = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(page[limit - 1].timestamp, page[limit - 1].id) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+def search_page(room_code, query, cursor=None, limit=None):
+    try:
+        limit = min(max(int(limit or SEARCH_PAGE_SIZE), 1), SEARCH_MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        limit = SEARCH_PAGE_SIZE
+    
+    use_fts = db.engine.dialect.name == 'sqlite'
+    position = None
+    if cursor:
+        position = decode_search_cursor(cursor) if use_fts else decode_cursor(cursor)
+        if not position:
+            return None
+    
+    terms = search_terms(query)
+    messages, next_cursor = [], None
+    if terms:
+        search = fts_search if use_fts else like_search
+        messages, next_cursor = search(room_code, terms, position, limit)
+    return {
+        'room': room_code,
+        'query': query,
+        'results': [{**serialize_message(msg), 'date': msg.timestamp.strftime('%Y-%m-%d')} for msg in messages],
+        'next_cursor': next_cursor
+    }
+
+def persist_messages(rows):
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            db.session.execute(insert(Message), rows)
+            db.session.commit()
+            commit_latency.observe(time.perf_counter() - started, 'write_behind')
+        except IntegrityError:
+            # One bad row (e.g. an unknown room on a server database that
+            # enforces the FK) must not take the rest of the batch with it
+            db.session.rollback()
+            # Settled rows leave the batch, so a retry after some other error
+            # does not write them twice
+            while rows:
+                row = rows[0]
+                try:
+                    db.session.execute(insert(Message), [row])
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+                    db_log.warning('dropped message: integrity error', extra={'room': row['room_code']})
+                rows.pop(0)
+
+recent_messages = None
+if RECENT_CACHE:
+    recent_messages = RecentMessages(
+        per_room=HISTORY_PAGE_SIZE,
+        max_rooms=RECENT_CACHE_ROOMS,
+        max_bytes=RECENT_CACHE_MAX_BYTES
+    )
+
+if recent_messages:
+    def recent_stat(key):
+        return lambda: recent_messages.stats()[key]
+    
+    metrics.gauge('chat_recent_cache_rooms', 'Rooms held in the recent message cache.', collect=recent_stat('rooms'))
+    metrics.gauge('chat_recent_cache_bytes', 'Estimated size of the recent message cache.', collect=recent_stat('bytes'))
+    metrics.counter('chat_recent_cache_lookups_total', 'Recent message cache lookups.', ['result'],
+                    collect=lambda: {('hit',): recent_messages.hits, ('miss',): recent_messages.misses})
+
+def latest_history(room_code):
+    if recent_messages:
+        cached = recent_messages.get(room_code)
+        if cached is not None:
+            return cached
+    
+    messages, next_cursor = load_history(room_code)
+    messages, next_cursor = with_archive(
+        room_code, [serialize_message(msg) for msg in messages], next_cursor, HISTORY_PAGE_SIZE
+    )
+    if recent_messages:
+        recent_messages.prime(room_code, messages, has_older=next_cursor is not None)
+    return messages, next_cursor
+
+def messages_after(room_code, cursor):
+    after = decode_cursor(cursor)
+    if not after:
+        return []
+    messages, _ = latest_history(room_code)
+    return [msg for msg in messages if decode_cursor(msg['cursor'])[0] > after[0]]
+
+message_writer = None
+if MESSAGE_WRITE_BEHIND:
+    message_writer = WriteBehindQueue(
+        persist_messages,
+        batch_size=WRITE_BEHIND_BATCH_SIZE,
+        interval=WRITE_BEHIND_INTERVAL_MS / 1000,
+        max_retries=WRITE_BEHIND_RETRIES,
+        backoff=WRITE_BEHIND_BACKOFF_MS / 1000
+    )
+    atexit.register(message_writer.stop)
+    
+    metrics.gauge('chat_write_behind_queue_depth', 'Messages waiting for the background writer.',
+                  collect=lambda: message_writer.stats()['queue_depth'])
+    metrics.counter('chat_write_behind_rows_total', 'Messages flushed by the background writer.', ['result'],
+                    collect=lambda: {('written',): message_writer.rows_written, ('failed',): message_writer.rows_failed})
+    metrics.counter('chat_write_behind_batches_total', 'Batches committed by the background writer.',
+                    collect=lambda: message_writer.batches)
+    metrics.counter('chat_write_behind_retries_total', 'Batch flushes retried after an error.',
+                    collect=lambda: message_writer.retries)
+
+# Transcript export - archived segments first, then live rows in keyset
+# batches, written out as they are read so memory stays flat for any room size
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_FIELDS = ['id', 'timestamp', 'username', 'verification_code', 'message']
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+def export_rows(room_code, batch_size=EXPORT_BATCH_SIZE):
+    last = None
+    for row in archive.iter_rows(room_code):
+        yield {
+            'id': row['id'],
+            'timestamp': row['timestamp'],
+            'username': row['username'],
+            'verification_code': row['verification_code'],
+            'message': row['content']
+        }
+        last = (datetime.fromisoformat(row['timestamp']), row['id'])
+    
+    # Plain columns rather than entities, so nothing piles up in the session
+    query = (
+        select(Message.id, Message.timestamp, Message.content, User.name, User.verification_code)
+        .join(User, Message.user_id == User.id)
+        .where(Message.room_code == room_code)
+        .order_by(Message.timestamp, Message.id)
+        .limit(batch_size)
+    )
+    while True:
+        batch_query = query
+        if last:
+            batch_query = query.where(or_(
+                Message.timestamp > last[0],
+                and_(Message.timestamp == last[0], Message.id > last[1])
+            ))
+        batch = db.session.execute(batch_query).all()
+        # A new read transaction per batch, so a long export does not hold
+        # one snapshot (and block WAL checkpoints) for its whole run
+        db.session.commit()
+        if not batch:
+            return
+        for row in batch:
+            yield {
+                'id': row.id,
+                'timestamp': row.timestamp.isoformat(),
+                'username': row.name,
+                'verification_code': row.verification_code,
+                'message': row.content
+            }
+        last = (batch[-1].timestamp, batch[-1].id)
+
+def export_chunks(rows, fmt):
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, EXPORT_FIELDS)
+        writer.writeheader()
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, ensure_ascii=False) + '\n')
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def retention_days(room):
+    return RETENTION_POLICY.get(room.code, RETENTION_POLICY.get(room.category, RETENTION_POLICY['*']))
+
+def compact_room(room_code, cutoff):
+    # Oldest first in batches: each batch is in the archive (fsynced and
+    # renamed into place) before its rows are deleted. After a crash in
+    # between, the same oldest rows are archived again under the same segment
+    # name, replacing the first copy
+    moved = 0
+    while True:
+        batch = (
+            Message.query.options(joinedload(Message.user))
+            .filter(Message.room_code == room_code, Message.timestamp < cutoff)
+            .order_by(Message.timestamp, Message.id)
+            .limit(COMPACTION_BATCH_SIZE)
+            .all()
+        )
+        if not batch:
+            return moved
+        archive.append(room_code, [{
+            'id': msg.id,
+            'content': msg.content,
+            'user_id': msg.user_id,
+            'username': msg.user.name,
+            'verification_code': msg.user.verification_code,
+            'timestamp': msg.timestamp.isoformat()
+        } for msg in batch])
+        Message.query.filter(Message.id.in_([msg.id for msg in batch])).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(batch)
+
+def compact_messages(now=None):
+    # None when another process is compacting right now
+    now = now or datetime.utcnow()
+    moved = {}
+    with archive.writer() as acquired:
+        if not acquired:
+            return None
+        if any(days > 0 for days in RETENTION_POLICY.values()):
+            for room in ChatRoom.query.order_by(ChatRoom.id).all():
+                days = retention_days(room)
+                if days > 0:
+                    count = compact_room(room.code, now - timedelta(days=days))
+                    if count:
+                        moved[room.code] = count
+        return moved, incremental_vacuum(db.engine)
+
+def compaction_loop():
+    while True:
+        socketio.sleep(RETENTION_INTERVAL)
+        with app.app_context():
+            try:
+                result = compact_messages()
+                if result is None:
+                    continue
+                moved, pages = result
+                if moved or pages:
+                    db_log.info('compacted messages', extra={'rooms': moved, 'pages_freed': pages})
+            except Exception:
+                db.session.rollback()
+                db_log.exception('compaction failed')
+
+compaction_started = False
+compaction_lock = threading.Lock()
+
+# Started by the first request so `flask` CLI commands importing the app do not run it
+@app.before_request
+def start_compaction():
+    global compaction_started
+    if RETENTION_INTERVAL > 0 and not compaction_started:
+        with compaction_lock:
+            if not compaction_started:
+                compaction_started = True
+                socketio.start_background_task(compaction_loop)
 
 # Public rooms
 PUBLIC_ROOMS = {
@@ -81,112 +862,85 @@ def create_public_rooms():
             for room_name in rooms:
                 existing_room = ChatRoom.query.filter_by(name=room_name, category=category).first()
                 if not existing_room:
-                    room = ChatRoom(
-                        code=generate_room_code(),
+                    add_with_code(lambda code: ChatRoom(
+                        code=code,
                         name=room_name,
                         category=category,
                         is_public=True,
                         created_by=1
-                    )
-                    db.session.add(room)
-        db.session.commit()
-    except Exception as e:
+                    ), 'code', ROOM_CODE_LENGTH)
+                    db.session.commit()
+    except Exception:
         db.session.rollback()
-        print(f"Error creating rooms: {e}")
+        db_log.exception('creating public rooms failed')
+
+# Lobby directory - public rooms almost never change, so their cards are
+# rendered once and reused until a public room is added, changed or removed
+LOBBY_CACHE_TTL = int(os.environ.get('LOBBY_CACHE_TTL', 300))
+LOBBY_CATEGORIES = [
+    ('students', '🎓 Students'),
+    ('parents', '👨‍👩‍👧‍👦 Parents'),
+    ('political', '🏛️ Political'),
+    ('entertainment', '🎭 Entertainment')
+]
+CATEGORY_EMOJI = {category: title.split(' ', 1)[0] for category, title in LOBBY_CATEGORIES}
+
+lobby_cache = TTLCache(maxsize=2, ttl=LOBBY_CACHE_TTL)
+
+def public_room_cards():
+    cards = lobby_cache.get('public')
+    if cards is None:
+        grouped = {category: [] for category in CATEGORY_EMOJI}
+        for room in ChatRoom.query.filter_by(is_public=True).order_by(ChatRoom.id).all():
+            grouped.setdefault(room.category, []).append(room)
+        cards = {
+            category: Markup(render_template('room_cards.html', rooms=rooms, emoji=CATEGORY_EMOJI.get(category, '💬')))
+            for category, rooms in grouped.items()
+        }
+        lobby_cache.set('public', cards)
+    return cards
+
+def public_room_codes():
+    codes = lobby_cache.get('codes')
+    if codes is None:
+        codes = frozenset(db.session.scalars(select(ChatRoom.code).filter_by(is_public=True)))
+        lobby_cache.set('codes', codes)
+    return codes
+
+# Flush only marks the session; the cache is cleared once the change is
+# committed, so a request reading in between cannot re-cache the old rooms
+@event.listens_for(ChatRoom, 'after_insert')
+@event.listens_for(ChatRoom, 'after_update')
+@event.listens_for(ChatRoom, 'after_delete')
+def mark_lobby_stale(mapper, connection, target):
+    # A room made private has to leave the lobby (and its counts) right away
+    state = inspect(target)
+    if target.is_public or state.attrs.is_public.history.deleted:
+        state.session.info['lobby_stale'] = True
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_lobby(session):
+    if session.info.pop('lobby_stale', False):
+        lobby_cache.clear()
+
+@event.listens_for(Session, 'after_rollback')
+def forget_stale_lobby(session):
+    session.info.pop('lobby_stale', None)
+
+@app.errorhandler(HasherBusy)
+def hasher_busy(e):
+    return render_template(
+        'notice.html',
+        kind='warning',
+        heading='⏳ Server busy',
+        text='Too many sign-ins right now. Please try again in a moment.',
+        links=[('← Back', request.referrer or url_for('index'), 'warning')]
+    ), 503, {'Retry-After': '1'}
 
 # Routes
 @app.route('/')
 def index():
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>💬 Chat App</title>
-        <style>
-            body { 
-                font-family: 'Segoe UI', Arial, sans-serif; 
-                max-width: 900px; 
-                margin: 0 auto; 
-                padding: 20px; 
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                color: white;
-            }
-            .container { 
-                background: rgba(255,255,255,0.95); 
-                padding: 40px; 
-                border-radius: 15px; 
-                text-align: center;
-                color: #333;
-                box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-            }
-            .btn { 
-                background: #007bff; 
-                color: white; 
-                padding: 15px 30px; 
-                text-decoration: none; 
-                border-radius: 8px; 
-                margin: 10px; 
-                display: inline-block;
-                font-weight: bold;
-                transition: all 0.3s;
-            }
-            .btn:hover { background: #0056b3; transform: translateY(-2px); }
-            .btn.success { background: #28a745; }
-            .btn.success:hover { background: #1e7e34; }
-            h1 { color: #333; font-size: 2.5em; margin-bottom: 20px; }
-            .features { 
-                display: grid; 
-                grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); 
-                gap: 20px; 
-                margin: 30px 0; 
-            }
-            .feature { 
-                background: #f8f9fa; 
-                padding: 20px; 
-                border-radius: 10px; 
-                border-left: 4px solid #007bff; 
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>💬 Welcome to ChatApp</h1>
-            <p style="font-size: 1.2em; margin-bottom: 30px;">Connect with people in real-time chat rooms!</p>
-            
-            <div class="features">
-                <div class="feature">
-                    <h3>🎓 Students</h3>
-                    <p>Join IIT communities</p>
-                </div>
-                <div class="feature">
-                    <h3>👨‍👩‍👧‍👦 Parents</h3>
-                    <p>Share parenting tips</p>
-                </div>
-                <div class="feature">
-                    <h3>🏛️ Political</h3>
-                    <p>Discuss current affairs</p>
-                </div>
-                <div class="feature">
-                    <h3>🎭 Entertainment</h3>
-                    <p>Share jokes & fun</p>
-                </div>
-            </div>
-            
-            <div style="margin-top: 40px;">
-                <a href="/register" class="btn success">🚀 Get Started</a>
-                <a href="/login" class="btn">🔐 Login</a>
-            </div>
-            
-            <p style="margin-top: 30px; color: #666; background: #f8f9fa; padding: 15px; border-radius: 8px;">
-                <strong>Demo Account:</strong><br>
-                Email: admin@chat.com<br>
-                Password: admin123
-            </p>
-        </div>
-    </body>
-    </html>
-    '''
+    return render_template('index.html')
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -196,72 +950,35 @@ def register():
         password = request.form['password']
         
         if User.query.filter_by(email=email).first():
-            return '''
-            <div style="font-family:Arial;max-width:500px;margin:50px auto;padding:30px;background:#fff3cd;border:1px solid #ffeaa7;border-radius:10px">
-                <h2 style="color:#856404">⚠️ Email already exists!</h2>
-                <a href="/register" style="background:#ffc107;color:#212529;padding:10px 20px;text-decoration:none;border-radius:5px">Try Again</a>
-                <a href="/login" style="background:#007bff;color:white;padding:10px 20px;text-decoration:none;border-radius:5px;margin-left:10px">Login Instead</a>
-            </div>
-            '''
+            return render_template(
+                'notice.html',
+                kind='warning',
+                heading='⚠️ Email already exists!',
+                links=[('Try Again', url_for('register'), 'warning'), ('Login Instead', url_for('login'), '')]
+            )
         
-        verification_code = generate_verification_code()
-        hashed_password = generate_password_hash(password)
+        hashed_password = password_hasher.hash(password)
         
-        new_user = User(
+        new_user = add_with_code(lambda code: User(
             name=name, 
             email=email, 
             password=hashed_password,
-            verification_code=verification_code
-        )
-        db.session.add(new_user)
+            verification_code=code
+        ), 'verification_code', VERIFICATION_CODE_LENGTH)
         db.session.commit()
         
-        return f'''
-        <div style="font-family:Arial;max-width:500px;margin:50px auto;padding:30px;background:#d4edda;border:1px solid #c3e6cb;border-radius:10px">
-            <h2 style="color:#155724">✅ Registration Successful!</h2>
-            <p style="background:#fff;padding:15px;border-radius:8px;border-left:4px solid #28a745">
-                <strong>Your verification code:</strong><br>
-                <span style="font-size:1.5em;font-family:monospace;color:#007bff">{verification_code}</span>
-            </p>
-            <p>Save this code! You can click on usernames in chat to see their verification codes.</p>
-            <a href="/login" style="background:#28a745;color:white;padding:12px 25px;text-decoration:none;border-radius:5px">Login Now</a>
-        </div>
-        '''
+        return render_template(
+            'registered.html',
+            kind='success',
+            heading='✅ Registration Successful!',
+            verification_code=new_user.verification_code,
+            links=[('Login Now', url_for('login'), 'success')]
+        )
     
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Register - Chat App</title>
-        <style>
-            body { font-family: Arial; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); min-height: 100vh; display: flex; align-items: center; justify-content: center; }
-            .form-container { background: white; padding: 40px; border-radius: 15px; box-shadow: 0 10px 30px rgba(0,0,0,0.3); max-width: 400px; width: 100%; }
-            input { width: 100%; padding: 12px; margin: 10px 0; border: 1px solid #ddd; border-radius: 8px; font-size: 16px; }
-            button { background: #28a745; color: white; padding: 15px; border: none; border-radius: 8px; width: 100%; font-size: 16px; font-weight: bold; cursor: pointer; }
-            button:hover { background: #1e7e34; }
-            h2 { text-align: center; color: #333; margin-bottom: 30px; }
-            .link { text-align: center; margin-top: 20px; }
-            .link a { color: #007bff; text-decoration: none; }
-        </style>
-    </head>
-    <body>
-        <div class="form-container">
-            <h2>🚀 Create Account</h2>
-            <form method="POST">
-                <input type="text" name="name" placeholder="Full Name" required minlength="2">
-                <input type="email" name="email" placeholder="Email Address" required>
-                <input type="password" name="password" placeholder="Password (min 6 chars)" required minlength="6">
-                <button type="submit">Create Account</button>
-            </form>
-            <div class="link">
-                <a href="/login">Already have an account? Login</a> | <a href="/">Home</a>
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
+    return render_template('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limited_route('login')
 def login():
     if request.method == 'POST':
         email = request.form['email']
@@ -269,56 +986,19 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         
-        if user and check_password_hash(user.password, password):
+        if user and password_hasher.check(user.password, password):
             login_user(user)
             return redirect(url_for('lobby'))
         else:
-            return '''
-            <div style="font-family:Arial;max-width:500px;margin:50px auto;padding:30px;background:#f8d7da;border:1px solid #f5c6cb;border-radius:10px">
-                <h2 style="color:#721c24">❌ Invalid Credentials!</h2>
-                <p>Please check your email and password.</p>
-                <a href="/login" style="background:#dc3545;color:white;padding:10px 20px;text-decoration:none;border-radius:5px">Try Again</a>
-                <a href="/register" style="background:#007bff;color:white;padding:10px 20px;text-decoration:none;border-radius:5px;margin-left:10px">Register</a>
-            </div>
-            '''
+            return render_template(
+                'notice.html',
+                kind='danger',
+                heading='❌ Invalid Credentials!',
+                text='Please check your email and password.',
+                links=[('Try Again', url_for('login'), 'danger'), ('Register', url_for('register'), '')]
+            )
     
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Login - Chat App</title>
-        <style>
-            body { font-family: Arial; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); min-height: 100vh; display: flex; align-items: center; justify-content: center; }
-            .form-container { background: white; padding: 40px; border-radius: 15px; box-shadow: 0 10px 30px rgba(0,0,0,0.3); max-width: 400px; width: 100%; }
-            input { width: 100%; padding: 12px; margin: 10px 0; border: 1px solid #ddd; border-radius: 8px; font-size: 16px; }
-            button { background: #007bff; color: white; padding: 15px; border: none; border-radius: 8px; width: 100%; font-size: 16px; font-weight: bold; cursor: pointer; }
-            button:hover { background: #0056b3; }
-            h2 { text-align: center; color: #333; margin-bottom: 30px; }
-            .demo { background: #e3f2fd; padding: 15px; border-radius: 8px; margin: 20px 0; text-align: center; }
-            .link { text-align: center; margin-top: 20px; }
-            .link a { color: #007bff; text-decoration: none; }
-        </style>
-    </head>
-    <body>
-        <div class="form-container">
-            <h2>🔐 Welcome Back</h2>
-            <form method="POST">
-                <input type="email" name="email" placeholder="Email Address" required autofocus>
-                <input type="password" name="password" placeholder="Password" required>
-                <button type="submit">Login</button>
-            </form>
-            <div class="demo">
-                <strong>🧪 Demo Account:</strong><br>
-                Email: admin@chat.com<br>
-                Password: admin123
-            </div>
-            <div class="link">
-                <a href="/register">Don't have an account? Register</a> | <a href="/">Home</a>
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
+    return render_template('login.html')
 
 @app.route('/logout')
 @login_required
@@ -329,127 +1009,29 @@ def logout():
 @app.route('/lobby')
 @login_required
 def lobby():
-    # Organize rooms by category
-    students_rooms = ChatRoom.query.filter_by(category='students', is_public=True).all()
-    parents_rooms = ChatRoom.query.filter_by(category='parents', is_public=True).all()
-    political_rooms = ChatRoom.query.filter_by(category='political', is_public=True).all()
-    entertainment_rooms = ChatRoom.query.filter_by(category='entertainment', is_public=True).all()
-    
-    def create_room_cards(rooms, emoji):
-        html = ''
-        for room in rooms:
-            html += f'''
-            <a href="/chat/{room.code}" style="display:block;padding:15px;margin:10px 0;background:white;text-decoration:none;border-radius:10px;border-left:5px solid #007bff;box-shadow:0 2px 5px rgba(0,0,0,0.1);transition:all 0.3s">
-                <strong style="color:#333">{emoji} {room.name}</strong>
-                <div style="color:#666;font-size:0.9em;margin-top:5px">Room Code: {room.code}</div>
-            </a>
-            '''
-        return html
-    
-    return f'''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Lobby - Chat App</title>
-        <style>
-            body {{ font-family: Arial; background: #f8f9fa; margin: 0; padding: 20px; }}
-            .container {{ max-width: 1200px; margin: 0 auto; }}
-            .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 15px; margin-bottom: 30px; display: flex; justify-content: space-between; align-items: center; }}
-            .grid {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); gap: 20px; }}
-            .category {{ background: #f8f9fa; padding: 20px; border-radius: 15px; border: 1px solid #e9ecef; }}
-            .category h3 {{ margin-top: 0; color: #495057; border-bottom: 2px solid #007bff; padding-bottom: 10px; }}
-            .custom-section {{ background: white; padding: 30px; border-radius: 15px; margin-top: 30px; box-shadow: 0 5px 15px rgba(0,0,0,0.1); }}
-            .form-group {{ display: flex; gap: 10px; margin: 15px 0; }}
-            .form-group input {{ flex: 1; padding: 12px; border: 1px solid #ddd; border-radius: 8px; }}
-            .btn {{ background: #007bff; color: white; padding: 12px 25px; border: none; border-radius: 8px; cursor: pointer; font-weight: bold; }}
-            .btn:hover {{ background: #0056b3; }}
-            .btn.success {{ background: #28a745; }}
-            .btn.success:hover {{ background: #1e7e34; }}
-            .user-info {{ background: rgba(255,255,255,0.2); padding: 10px 15px; border-radius: 8px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <div>
-                    <h1 style="margin:0">💬 Chat Lobby</h1>
-                    <p style="margin:5px 0 0 0">Choose a room to start chatting!</p>
-                </div>
-                <div class="user-info">
-                    <strong>Welcome, {current_user.name}!</strong><br>
-                    <small>Your Code: {current_user.verification_code}</small><br>
-                    <a href="/logout" style="color:#ffcccb;text-decoration:none;font-size:0.9em">Logout →</a>
-                </div>
-            </div>
-            
-            <div class="grid">
-                <div class="category">
-                    <h3>🎓 Students</h3>
-                    {create_room_cards(students_rooms, '🎓')}
-                </div>
-                
-                <div class="category">
-                    <h3>👨‍👩‍👧‍👦 Parents</h3>
-                    {create_room_cards(parents_rooms, '👨‍👩‍👧‍👦')}
-                </div>
-                
-                <div class="category">
-                    <h3>🏛️ Political</h3>
-                    {create_room_cards(political_rooms, '🏛️')}
-                </div>
-                
-                <div class="category">
-                    <h3>🎭 Entertainment</h3>
-                    {create_room_cards(entertainment_rooms, '🎭')}
-                </div>
-            </div>
-            
-            <div class="custom-section">
-                <h2 style="margin-top:0">🚀 Custom Rooms</h2>
-                <div style="display:grid;grid-template-columns:1fr 1fr;gap:30px">
-                    <div>
-                        <h4>Create New Room</h4>
-                        <form method="POST" action="/create_room">
-                            <div class="form-group">
-                                <input type="text" name="room_name" placeholder="Enter room name" required maxlength="50">
-                                <button type="submit" class="btn success">Create</button>
-                            </div>
-                        </form>
-                    </div>
-                    
-                    <div>
-                        <h4>Join Existing Room</h4>
-                        <form method="POST" action="/join_room">
-                            <div class="form-group">
-                                <input type="text" name="room_code" placeholder="8-digit room code" required maxlength="8" style="text-transform:uppercase">
-                                <button type="submit" class="btn">Join</button>
-                            </div>
-                        </form>
-                    </div>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
+    return render_template(
+        'lobby.html',
+        categories=LOBBY_CATEGORIES,
+        room_cards=public_room_cards(),
+        occupancy=public_occupancy()
+    )
 
 @app.route('/create_room', methods=['POST'])
 @login_required
+@rate_limited_route('create_room', key=lambda: current_user.id)
 def create_room():
     room_name = request.form['room_name']
-    room_code = generate_room_code()
     
-    new_room = ChatRoom(
-        code=room_code,
+    new_room = add_with_code(lambda code: ChatRoom(
+        code=code,
         name=room_name,
         category='custom',
         is_public=False,
         created_by=current_user.id
-    )
-    db.session.add(new_room)
+    ), 'code', ROOM_CODE_LENGTH)
     db.session.commit()
     
-    return redirect(url_for('chat', room_code=room_code))
+    return redirect(url_for('chat', room_code=new_room.code))
 
 @app.route('/join_room', methods=['POST'])
 @login_required
@@ -460,13 +1042,13 @@ def join_room_route():
     if room:
         return redirect(url_for('chat', room_code=room_code))
     else:
-        return '''
-        <div style="font-family:Arial;max-width:500px;margin:50px auto;padding:30px;background:#f8d7da;border:1px solid #f5c6cb;border-radius:10px">
-            <h2 style="color:#721c24">❌ Room Not Found!</h2>
-            <p>The room code you entered doesn't exist.</p>
-            <a href="/lobby" style="background:#007bff;color:white;padding:10px 20px;text-decoration:none;border-radius:5px">← Back to Lobby</a>
-        </div>
-        '''
+        return render_template(
+            'notice.html',
+            kind='danger',
+            heading='❌ Room Not Found!',
+            text="The room code you entered doesn't exist.",
+            links=[('← Back to Lobby', url_for('lobby'), '')]
+        )
 
 @app.route('/chat/<room_code>')
 @login_required
@@ -475,192 +1057,422 @@ def chat(room_code):
     if not room:
         return redirect(url_for('lobby'))
     
-    messages = Message.query.filter_by(room_code=room_code).order_by(Message.timestamp.asc()).all()
+    messages, next_cursor = latest_history(room_code)
     
-    message_html = ''
-    for msg in messages:
-        message_html += f'''
-        <div class="message">
-            <small style="color:#666">{msg.timestamp.strftime("%H:%M")}</small>
-            <strong class="username" onclick="toggleCode(this)" data-code="{msg.user.verification_code}">{msg.user.name}</strong>
-            <span class="verification-code" style="display:none;color:#007bff;font-size:0.8em"> [{msg.user.verification_code}]</span>:
-            <span>{msg.content}</span>
-        </div>
-        '''
+    # The page only changes when the room gets a new message (or the viewer,
+    # room or linked assets change), so reloads of a quiet room get a 304
+    newest_cursor = messages[-1]['cursor'] if messages else ''
+    etag = hashlib.sha1(
+        f"{current_user.id}:{current_user.name}:{current_user.verification_code}:"
+        f"{room.name}:{newest_cursor}:{next_cursor}:{assets.version}".encode()
+    ).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        chat_config = {
+            'room': room_code,
+            'oldestCursor': next_cursor,
+            'newestCursor': newest_cursor or None,
+            'socketOptions': {'transports': ['websocket']} if SOCKETIO_WEBSOCKET_ONLY else {}
+        }
+        response = make_response(render_template(
+            'chat.html', room=room, messages=messages, next_cursor=next_cursor, chat_config=chat_config
+        ))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/chat/<room_code>/history')
+@login_required
+def chat_history(room_code):
+    if not ChatRoom.query.filter_by(code=room_code).first():
+        return jsonify({'error': 'Room not found'}), 404
     
-    return f'''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>{room.name} - Chat</title>
-        <script src="https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.0.1/socket.io.js"></script>
-        <style>
-            body {{ font-family: Arial; margin: 0; background: #f8f9fa; }}
-            .chat-container {{ max-width: 800px; margin: 20px auto; background: white; border-radius: 15px; overflow: hidden; box-shadow: 0 5px 15px rgba(0,0,0,0.1); }}
-            .chat-header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; display: flex; justify-content: space-between; align-items: center; }}
-            .messages {{ height: 400px; overflow-y: auto; padding: 20px; background: #fafafa; }}
-            .message {{ margin: 10px 0; padding: 10px; background: white; border-radius: 8px; border-left: 4px solid #007bff; }}
-            .username {{ cursor: pointer; color: #007bff; font-weight: bold; }}
-            .username:hover {{ text-decoration: underline; }}
-            .chat-input {{ padding: 20px; background: white; border-top: 1px solid #eee; display: flex; gap: 10px; }}
-            .chat-input input {{ flex: 1; padding: 12px; border: 1px solid #ddd; border-radius: 8px; font-size: 16px; }}
-            .chat-input button {{ background: #007bff; color: white; border: none; padding: 12px 25px; border-radius: 8px; cursor: pointer; font-weight: bold; }}
-            .chat-input button:hover {{ background: #0056b3; }}
-            .status-message {{ font-style: italic; color: #666; background: #f8f9fa; border-left: 4px solid #6c757d; }}
-            .badge {{ background: #6c757d; color: white; padding: 5px 12px; border-radius: 15px; font-size: 0.9em; margin: 0 5px; }}
-            .badge.user {{ background: #17a2b8; }}
-        </style>
-    </head>
-    <body>
-        <div class="chat-container">
-            <div class="chat-header">
-                <div>
-                    <h2 style="margin:0">💬 {room.name}</h2>
-                    <small>Click on usernames to see verification codes</small>
-                </div>
-                <div>
-                    <span class="badge">{room_code}</span>
-                    <span class="badge user">Your: {current_user.verification_code}</span>
-                    <a href="/lobby" style="color:#ffcccb;text-decoration:none;margin-left:15px">← Lobby</a>
-                </div>
-            </div>
-            
-            <div class="messages" id="messages">
-                {message_html}
-            </div>
-            
-            <div class="chat-input">
-                <input type="text" id="messageInput" placeholder="Type your message..." maxlength="500" autofocus>
-                <button onclick="sendMessage()">Send</button>
-            </div>
-        </div>
-        
-        <script>
-            const socket = io();
-            const roomCode = '{room_code}';
-            const messagesDiv = document.getElementById('messages');
-            
-            // Join room
-            socket.emit('join', {{room: roomCode}});
-            
-            // Toggle verification code display
-            function toggleCode(element) {{
-                const codeSpan = element.nextElementSibling;
-                codeSpan.style.display = codeSpan.style.display === 'none' ? 'inline' : 'none';
-            }}
-            
-            // Send message
-            function sendMessage() {{
-                const input = document.getElementById('messageInput');
-                if (input.value.trim()) {{
-                    socket.emit('message', {{room: roomCode, message: input.value}});
-                    input.value = '';
-                }}
-            }}
-            
-            // Enter key to send
-            document.getElementById('messageInput').addEventListener('keypress', function(e) {{
-                if (e.key === 'Enter') sendMessage();
-            }});
-            
-            // Handle incoming messages
-            socket.on('message', function(data) {{
-                const div = document.createElement('div');
-                div.className = 'message';
-                div.innerHTML = `
-                    <small style="color:#666">${{data.timestamp}}</small>
-                    <strong class="username" onclick="toggleCode(this)" data-code="${{data.verification_code}}">${{data.username}}</strong>
-                    <span class="verification-code" style="display:none;color:#007bff;font-size:0.8em"> [${{data.verification_code}}]</span>:
-                    <span>${{data.message}}</span>
-                `;
-                messagesDiv.appendChild(div);
-                messagesDiv.scrollTop = messagesDiv.scrollHeight;
-            }});
-            
-            // Handle status messages
-            socket.on('status', function(data) {{
-                const div = document.createElement('div');
-                div.className = 'message status-message';
-                div.innerHTML = `<em>${{data.msg}}</em> <small>${{data.timestamp}}</small>`;
-                messagesDiv.appendChild(div);
-                messagesDiv.scrollTop = messagesDiv.scrollHeight;
-            }});
-            
-            // Auto-scroll to bottom
-            messagesDiv.scrollTop = messagesDiv.scrollHeight;
-        </script>
-    </body>
-    </html>
-    '''
+    page = history_page(
+        room_code,
+        before=request.args.get('before'),
+        limit=request.args.get('limit', type=int)
+    )
+    if page is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    response = jsonify(page)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@app.route('/chat/<room_code>/search')
+@login_required
+def chat_search(room_code):
+    if not ChatRoom.query.filter_by(code=room_code).first():
+        return jsonify({'error': 'Room not found'}), 404
+    
+    page = search_page(
+        room_code,
+        request.args.get('q', ''),
+        cursor=request.args.get('cursor'),
+        limit=request.args.get('limit', type=int)
+    )
+    if page is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify(page)
+
+@app.route('/chat/<room_code>/export')
+@login_required
+@rate_limited_route('export', key=lambda: current_user.id, methods=('GET',))
+def chat_export(room_code):
+    if not ChatRoom.query.filter_by(code=room_code).first():
+        return jsonify({'error': 'Room not found'}), 404
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unknown format'}), 400
+    
+    chunks = export_chunks(export_rows(room_code), fmt)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{room_code}.{fmt}"',
+        'Cache-Control': 'private, no-store',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return app.response_class(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+@app.route('/rooms/occupancy')
+@login_required
+def room_occupancy():
+    return jsonify(public_occupancy())
+
+def metrics_access(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if METRICS_TOKEN:
+            scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+            allowed = scheme.lower() == 'bearer' and secrets.compare_digest(token.encode(), METRICS_TOKEN.encode())
+        else:
+            allowed = request.remote_addr in LOOPBACK_ADDRESSES
+        if not allowed:
+            return jsonify({'error': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return wrapper
+
+@app.route('/metrics')
+@metrics_access
+def prometheus_metrics():
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/persistence')
+@metrics_access
+def persistence_metrics():
+    if not message_writer:
+        return jsonify({'write_behind': False})
+    return jsonify({'write_behind': True, **message_writer.stats()})
+
+@app.route('/metrics/recent')
+@metrics_access
+def recent_metrics():
+    if not recent_messages:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **recent_messages.stats()})
+
+# Presence - membership changes are coalesced into at most one 'presence'
+# broadcast per room per PRESENCE_INTERVAL_MS. Per-user join/leave status
+# lines are only sent in rooms small enough for them to be readable.
+PRESENCE_INTERVAL_MS = int(os.environ.get('PRESENCE_INTERVAL_MS', 1000))
+PRESENCE_STATUS_MAX_USERS = int(os.environ.get('PRESENCE_STATUS_MAX_USERS', 50))
+
+presence = PresenceRegistry()
+
+def public_occupancy():
+    # Private room codes work as invitations, so only public rooms are listed
+    codes = public_room_codes()
+    return {room: count for room, count in presence.counts().items() if room in codes}
+
+metrics.gauge('socketio_connected_sockets', 'Authenticated sockets connected to this worker.',
+              collect=lambda: len(socket_users))
+metrics.gauge('chat_room_occupancy', 'Distinct users present per public room.', ['room'],
+              collect=lambda: {(room,): count for room, count in public_occupancy().items()})
+
+def broadcast_presence(room_code, items):
+    socketio.emit('presence', presence.snapshot(room_code), to=room_code)
+
+presence_updates = Coalescer(
+    PRESENCE_INTERVAL_MS / 1000,
+    broadcast_presence,
+    start_task=socketio.start_background_task,
+    sleep=socketio.sleep
+)
+
+def announce(room_code, text):
+    if presence.count(room_code) <= PRESENCE_STATUS_MAX_USERS:
+        socketio.emit('status', {
+            'msg': text,
+            'timestamp': datetime.now().strftime('%H:%M')
+        }, to=room_code)
+
+# Outbound batching (opt-in) - chat lines for a room are collected for
+# MESSAGE_BATCH_WINDOW_MS and sent as one 'messages' event, trading a
+# bounded delay for far fewer packets in busy rooms. 0 sends each line.
+MESSAGE_BATCH_WINDOW_MS = int(os.environ.get('MESSAGE_BATCH_WINDOW_MS', 0))
+
+def broadcast_messages(room_code, messages):
+    socketio.emit('messages', {'room': room_code, 'messages': messages}, to=room_code)
+    messages_broadcast.inc('batch', amount=len(messages))
+
+message_batches = None
+if MESSAGE_BATCH_WINDOW_MS > 0:
+    message_batches = Coalescer(
+        MESSAGE_BATCH_WINDOW_MS / 1000,
+        broadcast_messages,
+        start_task=socketio.start_background_task,
+        sleep=socketio.sleep
+    )
 
 # Socket.IO Events
 @socketio.on('connect')
-def handle_connect():
+@instrumented('connect')
+def handle_connect(auth=None):
     if current_user.is_authenticated:
-        print(f'User {current_user.name} connected')
+        socket_users[request.sid] = current_user._get_current_object()
+        socket_log.info('connected', extra={'user_id': current_user.id, 'sid': request.sid})
         return True
     return False
 
+@socketio.on('disconnect')
+@instrumented('disconnect')
+def handle_disconnect(*args):
+    socket_users.pop(request.sid, None)
+    for room_code, (user_id, name) in presence.disconnect(request.sid):
+        presence_updates.add(room_code)
+        announce(room_code, f"{name} left the room")
+
 @socketio.on('join')
+@instrumented('join')
+@rate_limited('join')
 def on_join(data):
-    if current_user.is_authenticated:
+    user = socket_user()
+    if user:
         room_code = data['room']
         join_room(room_code)
-        emit('status', {
-            'msg': f"{current_user.name} joined the room",
-            'timestamp': datetime.now().strftime('%H:%M')
-        }, room=room_code)
+        
+        if data.get('after'):
+            missed = messages_after(room_code, data['after'])
+            if missed:
+                emit('replay', {'room': room_code, 'messages': missed})
+        
+        if presence.join(request.sid, room_code, user.id, user.name):
+            presence_updates.add(room_code)
+            announce(room_code, f"{user.name} joined the room")
 
 @socketio.on('leave')
+@instrumented('leave')
 def on_leave(data):
-    if current_user.is_authenticated:
+    user = socket_user()
+    if user:
         room_code = data['room']
         leave_room(room_code)
-        emit('status', {
-            'msg': f"{current_user.name} left the room",
-            'timestamp': datetime.now().strftime('%H:%M')
-        }, room=room_code)
+        if presence.leave(request.sid, room_code):
+            presence_updates.add(room_code)
+            announce(room_code, f"{user.name} left the room")
+
+@socketio.on('history')
+@instrumented('history')
+@rate_limited('history')
+def on_history(data):
+    user = socket_user()
+    if user:
+        page = history_page(data['room'], before=data.get('before'), limit=data.get('limit'))
+        if page is None:
+            emit('history_error', {'room': data['room'], 'msg': 'Invalid cursor'})
+            return
+        emit('history', page)
 
 @socketio.on('message')
+@instrumented('message')
+@rate_limited('message')
 def handle_message(data):
-    if current_user.is_authenticated:
+    user = socket_user()
+    if user:
+        messages_received.inc()
         room_code = data['room']
         content = data['message']
         
-        # Save to database
-        message = Message(
-            content=content,
-            user_id=current_user.id,
-            room_code=room_code
-        )
-        db.session.add(message)
-        db.session.commit()
+        # Prime a cold room before queueing the write, or the window would
+        # miss this message when the database is read ahead of the flush
+        if recent_messages and room_code not in recent_messages:
+            latest_history(room_code)
         
-        # Broadcast to room
-        emit('message', {
+        # Save to database - timestamp is taken now so batched rows keep send order
+        row = {
+            'content': content,
+            'user_id': user.id,
+            'room_code': room_code,
+            'timestamp': datetime.utcnow()
+        }
+        if message_writer:
+            message_writer.put(row)
+        else:
+            started = time.perf_counter()
+            db.session.add(Message(**row))
+            db.session.commit()
+            commit_latency.observe(time.perf_counter() - started, 'inline')
+        
+        # The id is assigned at flush time; id 0 in the cursor means "strictly
+        # before this timestamp" for history paging
+        payload = {
+            'id': None,
             'message': content,
-            'username': current_user.name,
-            'verification_code': current_user.verification_code,
-            'timestamp': datetime.now().strftime('%H:%M')
-        }, room=room_code)
+            'username': user.name,
+            'verification_code': user.verification_code,
+            'timestamp': row['timestamp'].strftime('%H:%M'),
+            'cursor': encode_cursor(row['timestamp'], 0)
+        }
+        if recent_messages:
+            recent_messages.append(room_code, payload)
+        
+        # Broadcast to room
+        if message_batches:
+            message_batches.add(room_code, payload)
+        else:
+            emit('message', payload, room=room_code)
+            messages_broadcast.inc('single')
+
+# Initialize database - every gunicorn worker imports this module at once, so
+# setup runs under a lock file in the instance folder and each step skips what
+# another process already did. DB_INIT_ON_START=0 leaves it to a one-shot
+# `flask init-db` (the Procfile's release step) instead.
+DB_INIT_ON_START = os.environ.get('DB_INIT_ON_START', '1') == '1'
+DB_INIT_LOCK = os.path.join(app.instance_path, '.init.lock')
+
+def init_db():
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(DB_INIT_LOCK, 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            db.create_all()
+            run_migrations(db.engine)
+            
+            # Create admin user if doesn't exist
+            if not db.session.get(User, 1):
+                db.session.add(User(
+                    name='Admin',
+                    email='admin@chat.com',
+                    password=generate_password_hash('admin123', method=PASSWORD_HASH_METHOD),
+                    verification_code='ADMIN12345'
+                ))
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    # Seeded by a process on another host sharing the database
+                    db.session.rollback()
+            
+            create_public_rooms()
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
 
-# Initialize database
 with app.app_context():
-    db.create_all()
+    install_sqlite_pragmas(db.engine, SQLITE_PRAGMAS)
+    if DB_INIT_ON_START:
+        init_db()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the schema, apply migrations and seed the admin and public rooms."""
+    init_db()
+    click.echo('database ready')
+
+@app.cli.command('check-db')
+@click.option('--writers', default=4, help='Concurrent writer threads.')
+@click.option('--messages', default=250, help='Messages per writer.')
+def check_db(writers, messages):
+    """Exercise the models against DATABASE_URL with concurrent writers."""
+    room_code = 'CHK' + generate_code(ROOM_CODE_LENGTH - 3)
+    room = ChatRoom(code=room_code, name='check-db', category='custom', is_public=False, created_by=1)
+    db.session.add(room)
+    db.session.commit()
     
-    # Create admin user if doesn't exist
-    admin = User.query.filter_by(id=1).first()
-    if not admin:
-        admin_user = User(
-            name='Admin',
-            email='admin@chat.com',
-            password=generate_password_hash('admin123'),
-            verification_code='ADMIN12345'
-        )
-        db.session.add(admin_user)
-        db.session.commit()
+    errors = []
+    
+    def writer(index):
+        with app.app_context():
+            try:
+                for i in range(messages):
+                    db.session.add(Message(content=f'{index}:{i}', user_id=1, room_code=room_code))
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                errors.append(repr(e))
+    
+    started = datetime.utcnow()
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    
+    # Walk the room back through the history cursor to check ordering and completeness
+    seen = []
+    cursor = None
+    while True:
+        page, next_cursor = load_history(room_code, before=decode_cursor(cursor) if cursor else None, limit=HISTORY_MAX_PAGE_SIZE)
+        seen = page + seen
+        if not next_cursor:
+            break
+        cursor = next_cursor
     
-    create_public_rooms()
+    expected = writers * messages
+    ordered = all((a.timestamp, a.id) < (b.timestamp, b.id) for a, b in zip(seen, seen[1:]))
+    
+    Message.query.filter_by(room_code=room_code).delete()
+    db.session.delete(room)
+    db.session.commit()
+    
+    click.echo(f"backend: {db.engine.dialect.name}")
+    click.echo(f"writes: {expected} attempted, {len(seen)} read back in {elapsed:.2f}s")
+    for error in errors:
+        click.echo(f"writer error: {error}")
+    if errors or len(seen) != expected or not ordered:
+        raise click.ClickException('database check failed')
+    click.echo('database check passed')
+
+@app.cli.command('export')
+@click.argument('room_code')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='File to write; stdout when omitted.')
+@click.option('--gzip', 'compress', is_flag=True, help='gzip the output.')
+def export(room_code, fmt, output, compress):
+    """Stream a room's full transcript, archived messages included."""
+    if not ChatRoom.query.filter_by(code=room_code).first():
+        raise click.ClickException(f'room {room_code} not found')
+    chunks = export_chunks(export_rows(room_code), fmt)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    stream = open(output, 'wb') if output else click.get_binary_stream('stdout')
+    try:
+        for chunk in chunks:
+            stream.write(chunk if compress else chunk.encode())
+    finally:
+        if output:
+            stream.close()
+
+@app.cli.command('compact')
+@click.option('--vacuum', is_flag=True, help='Rebuild the SQLite file once to switch it to incremental auto_vacuum.')
+def compact(vacuum):
+    """Archive messages past their retention period and reclaim free pages."""
+    if vacuum:
+        enable_incremental_vacuum(db.engine)
+    result = compact_messages()
+    if result is None:
+        raise click.ClickException('another process is compacting; try again later')
+    moved, pages = result
+    for room_code, count in moved.items():
+        click.echo(f"{room_code}: archived {count} messages")
+    click.echo(f"archived {sum(moved.values())} messages from {len(moved)} rooms")
+    if pages is not None:
+        click.echo(f"freed {pages} pages")
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,184 @@
+import gzip
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; run compaction from a single process there
+    fcntl = None
+
+MONTH_DIR = re.compile(r'^\d{4}-\d{2}$')
+SEGMENT_FILE = re.compile(r'^(\d{8}T\d{12})-(\d+)\.ndjson\.gz$')
+
+
+def parse_retention(spec, default_days=0):
+    """Parse "custom=30,students=180,ABCD1234=7" into {'custom': 30, ...}.
+
+    Keys are room categories or room codes; a room code wins over its
+    category. 0 days keeps messages forever.
+    """
+    policy = {}
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        key, _, days = part.partition('=')
+        policy[key.strip()] = int(days)
+    policy.setdefault('*', default_days)
+    return policy
+
+
+class ArchiveStore:
+    """Compressed NDJSON segments of old messages, one file per compaction
+    batch, under ``<room>/<YYYY-MM>/``.
+
+    A segment is written to a temporary file, fsynced and renamed into place,
+    so readers only ever see complete files. It is named after its oldest row:
+    a batch archived again after a crash (written, but not yet deleted from
+    the live table) replaces the earlier copy rather than adding a second one.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def room_dir(self, room_code):
+        return os.path.join(self.root, re.sub(r'[^A-Za-z0-9_-]', '_', room_code))
+
+    def has_room(self, room_code):
+        return os.path.isdir(self.room_dir(room_code))
+
+    def months(self, room_code):
+        try:
+            names = os.listdir(self.room_dir(room_code))
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if MONTH_DIR.match(name))
+
+    def segments(self, room_code, month):
+        """Segment file names of one month, oldest first."""
+        try:
+            names = os.listdir(os.path.join(self.room_dir(room_code), month))
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if SEGMENT_FILE.match(name))
+
+    @contextmanager
+    def writer(self):
+        """Hold the archive's cross-process lock while compacting.
+
+        Yields False at once, without waiting, when another process (or
+        thread) already holds it.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, '.lock'), 'a') as f:
+            if fcntl:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append(self, room_code, rows):
+        """Write one batch of rows, oldest first, as new segments."""
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row['timestamp'][:7], []).append(row)
+        for month, month_rows in by_month.items():
+            directory = os.path.join(self.room_dir(room_code), month)
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as raw:
+                    with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                        for row in month_rows:
+                            f.write(json.dumps(row, separators=(',', ':')).encode() + b'\n')
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                os.replace(temp_path, os.path.join(directory, segment_name(month_rows[0])))
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            fsync_dir(directory)
+
+    def read(self, room_code, month, name):
+        """Rows of one segment, oldest first."""
+        with gzip.open(os.path.join(self.room_dir(room_code), month, name), 'rt') as f:
+            return [json.loads(line) for line in f]
+
+    def iter_rows(self, room_code):
+        """Every archived row of a room, oldest first, read a line at a time.
+
+        Segments hold consecutive batches in order, so a row that is not newer
+        than the last one yielded is a stray copy and is skipped.
+        """
+        last = None
+        for month in self.months(room_code):
+            for name in self.segments(room_code, month):
+                with gzip.open(os.path.join(self.room_dir(room_code), month, name), 'rt') as f:
+                    for line in f:
+                        row = json.loads(line)
+                        key = sort_key(row)
+                        if last is None or key > last:
+                            last = key
+                            yield row
+
+    def page(self, room_code, before=None, limit=50):
+        """Up to ``limit`` rows older than ``before`` (a (timestamp, id) pair),
+        oldest first, and whether even older rows exist.
+
+        Segments are read newest first and only until the page is full.
+        """
+        before = tuple(before) if before else None
+        collected = []
+        for month in reversed(self.months(room_code)):
+            if before and month > before[0].strftime('%Y-%m'):
+                continue
+            for name in reversed(self.segments(room_code, month)):
+                if before and segment_key(name) >= before:
+                    continue
+                rows = self.read(room_code, month, name)
+                if before:
+                    rows = [row for row in rows if sort_key(row) < before]
+                collected = rows + collected
+                if len(collected) > limit:
+                    return (collected[-limit:] if limit else []), True
+        return collected, False
+
+
+def sort_key(row):
+    return datetime.fromisoformat(row['timestamp']), row['id']
+
+
+def segment_name(row):
+    timestamp, message_id = sort_key(row)
+    return f"{timestamp:%Y%m%dT%H%M%S%f}-{message_id:012d}.ndjson.gz"
+
+
+def segment_key(name):
+    """(timestamp, id) of a segment's oldest row, from its file name."""
+    match = SEGMENT_FILE.match(name)
+    return datetime.strptime(match.group(1), '%Y%m%dT%H%M%S%f'), int(match.group(2))
+
+
+def fsync_dir(path):
+    # Makes the rename itself durable; not possible on every platform
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, abort, request, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fingerprinted URLs change whenever the content does, so browsers can keep
+# a copy forever and never revalidate
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class Asset:
+    def __init__(self, path, data):
+        self.path = path
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.content_type = mimetype
+        if mimetype.startswith('text/') or mimetype == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        
+        root, ext = os.path.splitext(path)
+        self.url_path = f'{root}.{self.digest}{ext}'
+        
+        # Compressed variants are only kept when they actually save bytes
+        self.variants = {'identity': data}
+        gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(gzipped) < len(data):
+            self.variants['gzip'] = gzipped
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                self.variants['br'] = compressed
+
+    def etag(self, encoding):
+        return f'{self.digest}-{encoding}'
+
+
+class AssetManifest:
+    """Content-hashed, precompressed copies of everything under ``static/``.
+
+    Files are read once at startup; ``url()`` maps a plain static path to its
+    fingerprinted URL and ``serve()`` answers with the best encoding the
+    client accepts.
+    """
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.by_path = {}
+        self.by_url = {}
+        self.build()
+
+    def build(self):
+        by_path = {}
+        for directory, _, files in os.walk(self.static_folder):
+            for name in files:
+                full_path = os.path.join(directory, name)
+                path = os.path.relpath(full_path, self.static_folder).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    by_path[path] = Asset(path, f.read())
+        self.by_path = by_path
+        self.by_url = {asset.url_path: asset for asset in by_path.values()}
+        # Changes whenever any asset does, for caches of pages that link them
+        self.version = hashlib.sha256(
+            ''.join(sorted(asset.digest for asset in by_path.values())).encode()
+        ).hexdigest()[:12]
+
+    def url(self, path):
+        asset = self.by_path.get(path)
+        if asset is None:
+            # Unknown files still resolve through Flask's plain static route
+            return url_for('static', filename=path)
+        return url_for('asset', filename=asset.url_path)
+
+    def serve(self, filename):
+        asset = self.by_url.get(filename)
+        if asset is None:
+            abort(404)
+        
+        matched = [e for e in asset.variants if request.if_none_match.contains(asset.etag(e))]
+        if matched:
+            response = Response(status=304)
+            response.set_etag(asset.etag(matched[0]))
+        else:
+            encoding = 'identity'
+            for candidate in ('br', 'gzip'):
+                if candidate in asset.variants and request.accept_encodings[candidate]:
+                    encoding = candidate
+                    break
+            response = Response(asset.variants[encoding], content_type=asset.content_type)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+            response.set_etag(asset.etag(encoding))
+        
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+
+def init_assets(app):
+    manifest = AssetManifest(app.static_folder)
+    app.add_url_rule('/assets/<path:filename>', 'asset', manifest.serve)
+    app.jinja_env.globals['asset_url'] = manifest.url
+    return manifest
@@ -0,0 +1,47 @@
+import json
+import queue
+import threading
+
+import socketio
+
+
+class LocalManager(socketio.PubSubManager):
+    """In-process stand-in for a Redis/AMQP message queue.
+
+    Every LocalManager on the same channel sees every published message, so
+    several SocketIO servers created in one process behave like workers
+    sharing a real backplane. Useful for tests and offline fan-out checks.
+    """
+    name = 'local'
+
+    _subscribers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, url='local://', channel='flask-socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.inbox = queue.Queue()
+        if not write_only:
+            with self._lock:
+                self._subscribers.setdefault(channel, []).append(self.inbox)
+
+    def _publish(self, data):
+        # Round-trip through JSON like a real broker would
+        message = json.dumps(data)
+        with self._lock:
+            inboxes = list(self._subscribers.get(self.channel, []))
+        for inbox in inboxes:
+            inbox.put(message)
+
+    def _listen(self):
+        while True:
+            message = self.inbox.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        with self._lock:
+            inboxes = self._subscribers.get(self.channel, [])
+            if self.inbox in inboxes:
+                inboxes.remove(self.inbox)
+        self.inbox.put(None)
@@ -0,0 +1,98 @@
+"""Bulk room creation benchmark for the room code allocator.
+
+Creates rooms one commit at a time, the way /create_room does, against a
+scratch SQLite database that already holds --seed-rooms rooms. It compares
+the old strategy (random.choices plus a SELECT until the code is unused)
+with app.add_with_code (secrets and a bare INSERT, no pre-check), and
+prints rooms/sec and SQL statements per room as JSON.
+
+    python benchmarks/bulk_rooms.py --rooms 5000 --seed-rooms 100000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='chat-bench-'), 'bench.db')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('MESSAGE_WRITE_BEHIND', '0')
+
+import app as chat
+from sqlalchemy import event, insert
+
+
+def precheck_room(name):
+    # The allocator this benchmark replaced, kept here as the baseline
+    chars = string.ascii_uppercase + string.digits
+    code = ''.join(random.choices(chars, k=8))
+    while chat.ChatRoom.query.filter_by(code=code).first():
+        code = ''.join(random.choices(chars, k=8))
+    room = chat.ChatRoom(code=code, name=name, category='custom', is_public=False, created_by=1)
+    chat.db.session.add(room)
+    return room
+
+
+def allocator_room(name):
+    return chat.add_with_code(
+        lambda code: chat.ChatRoom(code=code, name=name, category='custom', is_public=False, created_by=1),
+        'code',
+        chat.ROOM_CODE_LENGTH
+    )
+
+
+STRATEGIES = {'precheck': precheck_room, 'allocator': allocator_room}
+
+
+def seed(count):
+    rows = [
+        {'code': chat.generate_code(chat.ROOM_CODE_LENGTH), 'name': f'seed {i}', 'category': 'custom',
+         'is_public': False, 'created_by': 1}
+        for i in range(count)
+    ]
+    chat.db.session.execute(insert(chat.ChatRoom).prefix_with('OR IGNORE'), rows)
+    chat.db.session.commit()
+
+
+def run(strategy, rooms):
+    statements = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    event.listen(chat.db.engine, 'before_cursor_execute', count)
+    started = time.perf_counter()
+    for i in range(rooms):
+        STRATEGIES[strategy](f'{strategy} {i}')
+        chat.db.session.commit()
+    elapsed = time.perf_counter() - started
+    event.remove(chat.db.engine, 'before_cursor_execute', count)
+
+    return {
+        'strategy': strategy,
+        'rooms_per_sec': round(rooms / elapsed, 1),
+        'ms_per_room': round(elapsed / rooms * 1000, 3),
+        'statements_per_room': round(statements[0] / rooms, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=2000)
+    parser.add_argument('--seed-rooms', type=int, default=50000)
+    args = parser.parse_args()
+
+    with chat.app.app_context():
+        seed(args.seed_rooms)
+        results = [run(strategy, args.rooms) for strategy in STRATEGIES]
+    print(json.dumps({'config': vars(args), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""Offline load test for the chat server.
+
+Starts app.py on a local port against a scratch SQLite database, then:
+
+* socket: N Socket.IO clients spread over M rooms join and send messages at
+  a fixed rate; reports messages/sec, deliveries/sec, p50/p99 end-to-end
+  delivery latency and the database commit rate.
+* http: times /lobby and /chat/<code> for rooms seeded with configurable
+  history sizes.
+
+Results are printed (or written with --output) as JSON so runs can be
+compared before and after a change:
+
+    python benchmarks/load_test.py --clients 50 --rooms 5 --rate 2 --seconds 10
+    python benchmarks/load_test.py --skip-socket --history-sizes 0,1000,50000
+
+Needs the client extras: pip install "python-socketio[client]" requests
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER = (
+    "import os\n"
+    "from app import app, socketio\n"
+    "socketio.run(app, host='127.0.0.1', port=int(os.environ['PORT']), allow_unsafe_werkzeug=True)\n"
+)
+
+# Limits high enough that the benchmark measures throughput, not the limiter
+UNLIMITED = 'message=1e9:1e9,join=1e9:1e9,history=1e9:1e9,create_room=1e9:1e9,login=1e9:1e9'
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    def __init__(self, workdir, extra_env, gunicorn_threads=None):
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.db_path = os.path.join(workdir, 'bench.db')
+        env = dict(os.environ)
+        env.update({
+            'PORT': str(self.port),
+            'DATABASE_URL': f'sqlite:///{self.db_path}',
+            'SECRET_KEY': 'benchmark',
+            'RATE_LIMITS': UNLIMITED,
+        })
+        command = [sys.executable, '-c', SERVER]
+        if gunicorn_threads:
+            # One gthread worker, as the Procfile runs it
+            env['GUNICORN_THREADS'] = str(gunicorn_threads)
+            command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+                       '--workers', '1', '--threads', str(gunicorn_threads), 'app:app']
+        env.update(extra_env)
+        self.log = open(os.path.join(workdir, 'server.log'), 'w')
+        self.process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'server exited, see {self.log.name}')
+            try:
+                if requests.get(self.url + '/', timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError('server did not start')
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+def login_session(base_url, index):
+    session = requests.Session()
+    email = f'bench{index}@example.com'
+    session.post(f'{base_url}/register', data={'name': f'Bench {index}', 'email': email, 'password': 'benchmark'})
+    response = session.post(f'{base_url}/login', data={'email': email, 'password': 'benchmark'}, allow_redirects=False)
+    if response.status_code != 302:
+        raise RuntimeError(f'login failed for {email}: {response.status_code}')
+    return session
+
+
+def create_room(base_url, session, name):
+    response = session.post(f'{base_url}/create_room', data={'room_name': name}, allow_redirects=False)
+    return response.headers['Location'].rstrip('/').rsplit('/', 1)[-1]
+
+
+def persistence_stats(base_url):
+    token = os.environ.get('METRICS_TOKEN')
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    return requests.get(f'{base_url}/metrics/persistence', headers=headers).json()
+
+
+def run_socket_benchmark(base_url, sessions, args):
+    rooms = [create_room(base_url, sessions[0], f'bench-{i}') for i in range(args.rooms)]
+    latencies = []
+    lock = threading.Lock()
+    received = [0]
+    clients = []
+    
+    def on_delivery(messages):
+        now = time.time()
+        with lock:
+            for msg in messages:
+                _, sent_at = msg['message'].split(' ', 1)
+                latencies.append((now - float(sent_at)) * 1000)
+            received[0] += len(messages)
+    
+    for index in range(args.clients):
+        session = sessions[index % len(sessions)]
+        client = socketio.Client(reconnection=False)
+        client.on('message', lambda data: on_delivery([data]))
+        client.on('messages', lambda data: on_delivery(data['messages']))
+        cookie = '; '.join(f'{k}={v}' for k, v in session.cookies.items())
+        client.connect(base_url, headers={'Cookie': cookie}, transports=['websocket'])
+        room = rooms[index % len(rooms)]
+        client.emit('join', {'room': room})
+        clients.append((client, room))
+    time.sleep(1)
+    
+    before = persistence_stats(base_url)
+    sent = [0]
+    stop_at = time.monotonic() + args.seconds
+    
+    def sender(client, room):
+        interval = 1 / args.rate
+        next_send = time.monotonic() + random.random() * interval
+        while next_send < stop_at:
+            time.sleep(max(0, next_send - time.monotonic()))
+            client.emit('message', {'room': room, 'message': f'bench {time.time():.6f}'})
+            with lock:
+                sent[0] += 1
+            next_send += interval
+    
+    started = time.monotonic()
+    threads = [threading.Thread(target=sender, args=pair) for pair in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    time.sleep(args.drain)
+    after = persistence_stats(base_url)
+    
+    for client, _ in clients:
+        client.disconnect()
+    
+    members_per_room = {room: sum(1 for _, r in clients if r == room) for room in rooms}
+    expected = sent[0] * (sum(members_per_room.values()) / len(rooms)) if rooms else 0
+    result = {
+        'clients': args.clients,
+        'rooms': args.rooms,
+        'messages_sent': sent[0],
+        'messages_per_sec': round(sent[0] / elapsed, 1),
+        'deliveries': received[0],
+        'deliveries_per_sec': round(received[0] / (elapsed + args.drain), 1),
+        'delivery_ratio': round(received[0] / expected, 4) if expected else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2) if latencies else None,
+            'p99': round(percentile(latencies, 99), 2) if latencies else None,
+            'max': round(max(latencies), 2) if latencies else None,
+        },
+    }
+    if after.get('write_behind'):
+        batches = after['batches'] - before['batches']
+        rows = after['rows_written'] - before['rows_written']
+        result['db'] = {
+            'mode': 'write_behind',
+            'rows_written': rows,
+            'commits': batches,
+            'commits_per_sec': round(batches / elapsed, 1),
+            'avg_flush_ms': after['avg_flush_ms'],
+            'max_flush_ms': after['max_flush_ms'],
+        }
+    else:
+        result['db'] = {'mode': 'inline', 'commits': sent[0], 'commits_per_sec': round(sent[0] / elapsed, 1)}
+    return result
+
+
+def seed_history(db_path, room_code, count):
+    start = datetime.utcnow() - timedelta(seconds=count)
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        conn.executemany(
+            'INSERT INTO message (content, user_id, room_code, "timestamp") VALUES (?, 1, ?, ?)',
+            ((f'history message {i}', room_code, (start + timedelta(seconds=i)).isoformat(' ')) for i in range(count))
+        )
+
+
+def time_requests(session, url, count, concurrency):
+    def fetch(_):
+        started = time.perf_counter()
+        response = session.get(url, headers={'Accept-Encoding': 'gzip'})
+        return (time.perf_counter() - started) * 1000, response.status_code, len(response.content)
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(fetch, range(count)))
+    elapsed = time.perf_counter() - started
+    timings = [r[0] for r in results]
+    return {
+        'requests': count,
+        'requests_per_sec': round(count / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'errors': sum(1 for r in results if r[1] != 200),
+        'body_bytes': round(statistics.mean(r[2] for r in results)),
+    }
+
+
+def run_http_benchmark(server, session, args):
+    results = {'lobby': time_requests(session, f'{server.url}/lobby', args.requests, args.http_concurrency), 'chat': []}
+    for size in args.history_sizes:
+        room = create_room(server.url, session, f'history-{size}')
+        seed_history(server.db_path, room, size)
+        entry = {'history_size': size}
+        entry.update(time_requests(session, f'{server.url}/chat/{room}', args.requests, args.http_concurrency))
+        results['chat'].append(entry)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=20, help='Simulated Socket.IO clients')
+    parser.add_argument('--rooms', type=int, default=4, help='Rooms the clients are spread over')
+    parser.add_argument('--rate', type=float, default=1.0, help='Messages per second per client')
+    parser.add_argument('--seconds', type=float, default=10, help='Send duration')
+    parser.add_argument('--drain', type=float, default=2, help='Seconds to wait for in-flight deliveries')
+    parser.add_argument('--users', type=int, default=10, help='Distinct accounts the clients log in as')
+    parser.add_argument('--history-sizes', type=lambda v: [int(x) for x in v.split(',')], default=[0, 1000, 10000])
+    parser.add_argument('--requests', type=int, default=200, help='Requests per HTTP scenario')
+    parser.add_argument('--http-concurrency', type=int, default=4)
+    parser.add_argument('--skip-socket', action='store_true')
+    parser.add_argument('--skip-http', action='store_true')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='Extra server environment, e.g. --env MESSAGE_BATCH_WINDOW_MS=20')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args()
+    
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    workdir = tempfile.mkdtemp(prefix='chat-load-')
+    server = Server(workdir, extra_env)
+    try:
+        server.wait_ready()
+        sessions = [login_session(server.url, i) for i in range(max(1, args.users))]
+        report = {
+            'started_at': datetime.utcnow().isoformat() + 'Z',
+            'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        }
+        if not args.skip_socket:
+            report['socket'] = run_socket_benchmark(server.url, sessions, args)
+        if not args.skip_http:
+            report['http'] = run_http_benchmark(server, sessions[0], args)
+    finally:
+        server.stop()
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Login storm benchmark: chat latency while /login is flooded.
+
+Starts app.py like load_test.py, keeps a pair of Socket.IO clients talking in
+one room, and measures message delivery latency first on a quiet server and
+then while --logins threads post to /login back to back. Login outcomes
+(accepted vs 503) and latencies are reported too, as JSON:
+
+    python benchmarks/login_storm.py --logins 16 --seconds 10
+    python benchmarks/login_storm.py --env PASSWORD_HASH_WORKERS=64 --env PASSWORD_HASH_QUEUE=1000
+
+The second run approximates unbounded inline hashing for comparison. The
+Werkzeug development server starts a thread per request, so a request
+waiting on a hash never starves anything there; --gunicorn-threads N runs a
+single gunicorn worker with N threads instead, like the Procfile.
+
+Needs the client extras: pip install "python-socketio[client]" requests
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+import socketio
+
+from load_test import Server, create_room, login_session, percentile
+
+
+def latency_summary(values):
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 2) if values else None,
+        'p99': round(percentile(values, 99), 2) if values else None,
+        'max': round(max(values), 2) if values else None,
+    }
+
+
+class ChatProbe:
+    """One client sends timestamped messages at a fixed rate, another times their arrival."""
+
+    def __init__(self, base_url, session, room, rate):
+        cookie = '; '.join(f'{k}={v}' for k, v in session.cookies.items())
+        self.rate = rate
+        self.room = room
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.sender = socketio.Client(reconnection=False)
+        self.receiver = socketio.Client(reconnection=False)
+        self.receiver.on('message', self.on_message)
+        for client in (self.sender, self.receiver):
+            client.connect(base_url, headers={'Cookie': cookie}, transports=['websocket'])
+            client.emit('join', {'room': room})
+        time.sleep(0.5)
+
+    def on_message(self, data):
+        now = time.time()
+        _, sent_at = data['message'].split(' ', 1)
+        with self.lock:
+            self.latencies.append((now - float(sent_at)) * 1000)
+
+    def run(self, seconds):
+        with self.lock:
+            self.latencies = []
+        stop_at = time.monotonic() + seconds
+        interval = 1 / self.rate
+        while time.monotonic() < stop_at:
+            self.sender.emit('message', {'room': self.room, 'message': f'probe {time.time():.6f}'})
+            time.sleep(interval)
+        time.sleep(1)
+        with self.lock:
+            return list(self.latencies)
+
+    def close(self):
+        self.sender.disconnect()
+        self.receiver.disconnect()
+
+
+def storm(base_url, email, threads, stop):
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def login():
+        session = requests.Session()
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = session.post(f'{base_url}/login', data={'email': email, 'password': 'benchmark'},
+                                    allow_redirects=False)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                statuses[response.status_code] += 1
+                latencies.append(elapsed)
+
+    workers = [threading.Thread(target=login) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    return workers, statuses, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=16, help='Concurrent login threads during the storm')
+    parser.add_argument('--seconds', type=float, default=10, help='Length of the quiet and the storm phase')
+    parser.add_argument('--rate', type=float, default=20, help='Probe messages per second')
+    parser.add_argument('--gunicorn-threads', type=int, help='Serve with one gunicorn worker and this many threads')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='Extra server environment, e.g. --env PASSWORD_HASH_WORKERS=2')
+    args = parser.parse_args()
+
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    server = Server(tempfile.mkdtemp(prefix='chat-storm-'), extra_env, args.gunicorn_threads)
+    try:
+        server.wait_ready()
+        chatter = login_session(server.url, 0)
+        login_session(server.url, 1)
+        probe = ChatProbe(server.url, chatter, create_room(server.url, chatter, 'storm'), args.rate)
+
+        quiet = probe.run(args.seconds)
+
+        stop = threading.Event()
+        workers, statuses, login_latencies = storm(server.url, 'bench1@example.com', args.logins, stop)
+        loaded = probe.run(args.seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        probe.close()
+
+        report = {
+            'config': vars(args),
+            'chat_latency_ms': {'quiet': latency_summary(quiet), 'storm': latency_summary(loaded)},
+            'logins': {
+                'statuses': {str(code): count for code, count in sorted(statuses.items())},
+                'per_sec': round(sum(statuses.values()) / args.seconds, 1),
+                'latency_ms': latency_summary(login_latencies),
+            },
+        }
+    finally:
+        server.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Concurrent read/write benchmark for the SQLite engine profile.
+
+Runs the same workload - writer threads committing one chat message at a
+time while reader threads page room history - against a stock SQLite engine
+and against the tuned profile from database.py, then prints JSON results.
+
+    python benchmarks/sqlite_concurrency.py --writers 4 --readers 8 --seconds 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import DEFAULT_SQLITE_PRAGMAS, install_sqlite_pragmas, sqlite_engine_options
+
+ROOMS = [f'ROOM{i:04d}' for i in range(20)]
+
+SCHEMA = [
+    'CREATE TABLE message (id INTEGER PRIMARY KEY, content TEXT NOT NULL, user_id INTEGER NOT NULL, '
+    'room_code VARCHAR(8) NOT NULL, "timestamp" DATETIME)',
+    'CREATE INDEX ix_message_room_timestamp_id ON message (room_code, "timestamp", id)',
+]
+
+HISTORY = text('SELECT id, content, user_id, "timestamp" FROM message WHERE room_code = :room '
+               'ORDER BY "timestamp" DESC, id DESC LIMIT 50')
+INSERT = text('INSERT INTO message (content, user_id, room_code, "timestamp") VALUES (:content, 1, :room, :ts)')
+
+
+def make_engine(path, tuned):
+    url = f'sqlite:///{path}'
+    if not tuned:
+        return create_engine(url, connect_args={'check_same_thread': False})
+    engine = create_engine(url, **sqlite_engine_options(DEFAULT_SQLITE_PRAGMAS, environ={}))
+    install_sqlite_pragmas(engine, DEFAULT_SQLITE_PRAGMAS)
+    return engine
+
+
+def seed(engine, rows):
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(INSERT, [
+            {'content': f'seed {i}', 'room': random.choice(ROOMS), 'ts': datetime.utcnow()}
+            for i in range(rows)
+        ])
+
+
+def run(tuned, writers, readers, seconds, seed_rows):
+    directory = tempfile.mkdtemp(prefix='chat-bench-')
+    engine = make_engine(os.path.join(directory, 'bench.db'), tuned)
+    seed(engine, seed_rows)
+    
+    counts = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+    
+    def bump(key):
+        with lock:
+            counts[key] += 1
+    
+    def writer():
+        while time.monotonic() < stop:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(INSERT, {'content': 'hello', 'room': random.choice(ROOMS), 'ts': datetime.utcnow()})
+                bump('writes')
+            except OperationalError:
+                bump('write_errors')
+    
+    def reader():
+        while time.monotonic() < stop:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(HISTORY, {'room': random.choice(ROOMS)}).fetchall()
+                bump('reads')
+            except OperationalError:
+                bump('read_errors')
+    
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    
+    return {
+        'profile': 'tuned' if tuned else 'default',
+        'writes_per_sec': round(counts['writes'] / seconds, 1),
+        'reads_per_sec': round(counts['reads'] / seconds, 1),
+        'write_errors': counts['write_errors'],
+        'read_errors': counts['read_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--seed-rows', type=int, default=20000)
+    args = parser.parse_args()
+    
+    results = [run(tuned, args.writers, args.readers, args.seconds, args.seed_rows) for tuned in (False, True)]
+    print(json.dumps({'config': vars(args), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
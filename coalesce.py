@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+
+log = logging.getLogger('chat.socket')
+
+
+class Coalescer:
+    """Groups items per key and flushes each key at most once per ``interval``.
+
+    ``add(key, item)`` is O(1); a single background task wakes every
+    ``interval`` seconds and calls ``flush(key, items)`` for every key that
+    received something since the last pass. ``item`` may be None when only
+    the fact that a key changed matters.
+    """
+
+    def __init__(self, interval, flush, start_task=None, sleep=None):
+        self.interval = interval
+        self.flush = flush
+        self.start_task = start_task or self._start_thread
+        self.sleep = sleep or time.sleep
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self.flushes = 0
+
+    def add(self, key, item=None):
+        with self.lock:
+            items = self.pending.setdefault(key, [])
+            if item is not None:
+                items.append(item)
+            if not self.running:
+                self.running = True
+                self.start_task(self._run)
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for key, items in pending.items():
+            try:
+                self.flush(key, items)
+                self.flushes += 1
+            except Exception:
+                log.exception('coalesced flush failed', extra={'key': key})
+
+    def _run(self):
+        while True:
+            self.sleep(self.interval)
+            with self.lock:
+                if not self.pending:
+                    # Idle - the next add() starts a fresh task
+                    self.running = False
+                    return
+            self.drain()
+
+    @staticmethod
+    def _start_thread(target):
+        threading.Thread(target=target, daemon=True).start()
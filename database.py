@@ -0,0 +1,98 @@
+import os
+
+from sqlalchemy import event, text
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer; NORMAL sync is durable across app crashes in WAL mode.
+# INCREMENTAL auto_vacuum lets compaction hand freed pages back to the OS; it
+# only takes effect on new files, or after one full VACUUM.
+DEFAULT_SQLITE_PRAGMAS = {
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -16000,
+    'mmap_size': 134217728,
+    'temp_store': 'MEMORY',
+}
+
+def sqlite_pragmas_from_env(environ=os.environ):
+    return {
+        'auto_vacuum': environ.get('SQLITE_AUTO_VACUUM', DEFAULT_SQLITE_PRAGMAS['auto_vacuum']),
+        'journal_mode': environ.get('SQLITE_JOURNAL_MODE', DEFAULT_SQLITE_PRAGMAS['journal_mode']),
+        'synchronous': environ.get('SQLITE_SYNCHRONOUS', DEFAULT_SQLITE_PRAGMAS['synchronous']),
+        'busy_timeout': int(environ.get('SQLITE_BUSY_TIMEOUT_MS', DEFAULT_SQLITE_PRAGMAS['busy_timeout'])),
+        'cache_size': int(environ.get('SQLITE_CACHE_SIZE', DEFAULT_SQLITE_PRAGMAS['cache_size'])),
+        'mmap_size': int(environ.get('SQLITE_MMAP_SIZE', DEFAULT_SQLITE_PRAGMAS['mmap_size'])),
+        'temp_store': environ.get('SQLITE_TEMP_STORE', DEFAULT_SQLITE_PRAGMAS['temp_store']),
+    }
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+def install_sqlite_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite':
+        return False
+    
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+    
+    return True
+
+def incremental_vacuum(engine):
+    """Return free pages to the OS; returns how many, or None when the
+    database is not SQLite in incremental auto_vacuum mode."""
+    if engine.dialect.name != 'sqlite':
+        return None
+    with engine.connect() as conn:
+        if conn.execute(text('PRAGMA auto_vacuum')).scalar() != 2:
+            return None
+        free = conn.execute(text('PRAGMA freelist_count')).scalar()
+        conn.commit()
+        # sqlite3's execute() steps the pragma once, freeing a single page;
+        # executescript() runs it to completion
+        conn.connection.driver_connection.executescript('PRAGMA incremental_vacuum')
+        return free - conn.execute(text('PRAGMA freelist_count')).scalar()
+
+def enable_incremental_vacuum(engine):
+    # Switching an existing file to incremental mode needs one full rebuild
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('PRAGMA auto_vacuum=INCREMENTAL'))
+        conn.execute(text('VACUUM'))
+
+def database_url(environ=os.environ):
+    url = environ.get('DATABASE_URL', 'sqlite:///chat_app.db')
+    # Heroku and some hosts still hand out the pre-SQLAlchemy-1.4 scheme
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(url, pragmas, environ=os.environ):
+    if url.startswith('sqlite'):
+        return sqlite_engine_options(pragmas, environ)
+    return {
+        'pool_size': int(environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+        # Server connections can be dropped by the server or a proxy while idle
+        'pool_pre_ping': True,
+    }
+
+def sqlite_engine_options(pragmas, environ=os.environ):
+    return {
+        'pool_size': int(environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+        'connect_args': {
+            # Connections are shared between gunicorn threads and the write-behind thread
+            'check_same_thread': False,
+            'timeout': pragmas['busy_timeout'] / 1000,
+        },
+    }
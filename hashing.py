@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash did not finish in time."""
+
+
+class PasswordHasher:
+    """Runs password hashing on a small dedicated thread pool.
+
+    At most ``workers`` hashes run at once, so a burst of logins cannot take
+    every CPU from socket traffic. Up to ``max_pending`` more wait their turn;
+    beyond that callers get ``HasherBusy`` straight away instead of queueing.
+    """
+
+    def __init__(self, method='scrypt', workers=2, max_pending=8, timeout=10):
+        self.method = method
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def stats(self):
+        with self.lock:
+            return {'in_flight': self.in_flight, 'completed': self.completed, 'rejected': self.rejected}
+
+    def _run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise HasherBusy()
+        with self.lock:
+            self.in_flight += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._release(completed=False)
+            raise
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # The hash keeps its slot until it finishes
+            with self.lock:
+                self.rejected += 1
+            raise HasherBusy()
+
+    def _release(self, completed=True):
+        with self.lock:
+            self.in_flight -= 1
+            self.completed += completed
+        self.slots.release()
@@ -0,0 +1,92 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+
+# Loggers that make up each subsystem whose level can be set on its own
+SUBSYSTEMS = {
+    'http': ['chat.http', 'werkzeug'],
+    'socket': ['chat.socket', 'socketio', 'engineio'],
+    'db': ['chat.db', 'sqlalchemy.engine'],
+}
+
+# Attributes every LogRecord has; anything else came in through extra=
+RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+def parse_levels(spec, defaults=None):
+    """Parse "http=info,socket=warning" into {'http': 20, 'socket': 30}."""
+    levels = dict(defaults or {})
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        name, _, level = part.partition('=')
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Lets through one in every ``1 / rate`` records below WARNING."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.every = max(int(round(1 / rate)), 1) if rate > 0 else 0
+        self.seen = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if not self.every:
+            return False
+        self.seen += 1
+        return self.seen % self.every == 0
+
+
+def configure_logging(level='INFO', levels=None, packet_sample_rate=0.01, stream=None):
+    """Send all logging through a queue to one background JSON writer.
+
+    Callers only pay for formatting the record into the queue; the write to
+    ``stream`` happens on the listener thread. Per-packet Socket.IO and
+    Engine.IO logs are sampled at ``packet_sample_rate``.
+    """
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=False)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+
+    for subsystem, level_for_subsystem in (levels or {}).items():
+        for name in SUBSYSTEMS.get(subsystem, [subsystem]):
+            logging.getLogger(name).setLevel(level_for_subsystem)
+
+    for name in ('socketio.server', 'engineio.server'):
+        packet_logger = logging.getLogger(name)
+        packet_logger.addFilter(SampleFilter(packet_sample_rate))
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,51 @@
+from sqlalchemy import text
+
+# Versioned schema steps for databases created before the current models.
+# Statements must be safe to run against a database that db.create_all()
+# already brought up to date, so only additive, idempotent DDL goes here.
+# A step may name the dialects it applies to; elsewhere it is recorded as
+# applied without running.
+MIGRATIONS = [
+    (1, [
+        'CREATE INDEX IF NOT EXISTS ix_message_room_timestamp_id ON message (room_code, "timestamp", id)',
+        'CREATE INDEX IF NOT EXISTS ix_chat_room_category_public ON chat_room (category, is_public)',
+        'CREATE INDEX IF NOT EXISTS ix_chat_room_name_category ON chat_room (name, category)',
+    ]),
+    # Full-text index over message content, kept in sync by triggers so every
+    # insert path (inline commit, write-behind batches) is covered. room_code
+    # is indexed too so searches are scoped inside the index, and weighted 0
+    # so it does not affect ranking.
+    (2, [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5("
+        "content, room_code, content='message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS message_fts_insert AFTER INSERT ON message BEGIN "
+        "INSERT INTO message_fts (rowid, content, room_code) VALUES (new.id, new.content, new.room_code); END",
+        "CREATE TRIGGER IF NOT EXISTS message_fts_delete AFTER DELETE ON message BEGIN "
+        "INSERT INTO message_fts (message_fts, rowid, content, room_code) "
+        "VALUES ('delete', old.id, old.content, old.room_code); END",
+        "CREATE TRIGGER IF NOT EXISTS message_fts_update AFTER UPDATE ON message BEGIN "
+        "INSERT INTO message_fts (message_fts, rowid, content, room_code) "
+        "VALUES ('delete', old.id, old.content, old.room_code); "
+        "INSERT INTO message_fts (rowid, content, room_code) VALUES (new.id, new.content, new.room_code); END",
+        "INSERT INTO message_fts (message_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+        "INSERT INTO message_fts (message_fts) VALUES ('rebuild')",
+    ], ('sqlite',)),
+]
+
+def current_version(conn):
+    conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    return conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+
+def run_migrations(engine):
+    applied = []
+    with engine.begin() as conn:
+        version = current_version(conn)
+        for target, statements, *dialects in MIGRATIONS:
+            if target <= version:
+                continue
+            if not dialects or conn.dialect.name in dialects[0]:
+                for statement in statements:
+                    conn.execute(text(statement))
+            conn.execute(text('INSERT INTO schema_version (version) VALUES (:version)'), {'version': target})
+            applied.append(target)
+    return applied
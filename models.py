@@ -1,8 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
-import string
-import random
 
 db = SQLAlchemy()
 
@@ -32,18 +30,3 @@ class Message(db.Model):
     
     user = db.relationship('User', backref='messages')
     room = db.relationship('ChatRoom', backref='messages')
-
-def generate_room_code():
-    chars = string.ascii_uppercase + string.digits
-    code = ''.join(random.choices(chars, k=8))
-    while ChatRoom.query.filter_by(code=code).first():
-        code = ''.join(random.choices(chars, k=8))
-    return code
-
-def generate_verification_code():
-    chars = string.ascii_uppercase + string.digits
-    code = ''.join(random.choices(chars, k=10))
-    # Check for uniqueness
-    while User.query.filter_by(verification_code=code).first():
-        code = ''.join(random.choices(chars, k=10))
-    return code
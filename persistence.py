@@ -0,0 +1,133 @@
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger('chat.db')
+
+
+class WriteBehindQueue:
+    """Collects rows off the request path and hands them to ``flush`` in batches.
+
+    A batch is flushed when ``batch_size`` rows are pending or ``interval``
+    seconds have passed since its first row, whichever comes first. ``stop``
+    drains everything still queued before returning.
+
+    A batch whose flush raises is retried up to ``max_retries`` times, waiting
+    ``backoff`` seconds and doubling each time, so a busy database does not
+    lose it. ``flush`` may remove rows it has already committed from the list
+    it is given; only what is left is tried again.
+    """
+
+    def __init__(self, flush, batch_size=100, interval=0.005, max_pending=10000, max_retries=5, backoff=0.05):
+        self.flush = flush
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stopped = False
+        
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self.thread.start()
+
+    def put(self, row):
+        if self.stopped:
+            # Late writers after shutdown still get persisted, just synchronously
+            self._flush([row])
+            return
+        self.start()
+        # Blocks when max_pending rows are queued, pushing back on producers
+        self.pending.put(row)
+
+    def stop(self, timeout=10):
+        self.stopped = True
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queue_depth': self.pending.qsize(),
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'retries': self.retries,
+            'batches': self.batches,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+            'max_flush_ms': round(self.max_flush_ms, 3),
+            'avg_flush_ms': round(self.total_flush_ms / self.batches, 3) if self.batches else 0.0,
+        }
+
+    def _run(self):
+        while True:
+            row = self.pending.get()
+            if row is None:
+                return
+            batch = [row]
+            deadline = time.monotonic() + self.interval
+            done = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    row = self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    done = True
+                    break
+                batch.append(row)
+            self._flush(batch)
+            if done:
+                # Anything queued behind the sentinel still needs writing
+                self._drain()
+                return
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                row = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                batch.append(row)
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch):
+        size = len(batch)
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.flush(batch)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    self.rows_written += size - len(batch)
+                    self.rows_failed += len(batch)
+                    log.exception('write-behind flush failed', extra={'rows': len(batch), 'attempts': attempt + 1})
+                    return
+                delay = self.backoff * 2 ** attempt
+                self.retries += 1
+                log.warning('write-behind flush failed, retrying', exc_info=True,
+                            extra={'rows': len(batch), 'attempt': attempt + 1, 'delay_s': delay})
+                time.sleep(delay)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.rows_written += size
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
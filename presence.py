@@ -0,0 +1,85 @@
+import threading
+
+
+class PresenceRegistry:
+    """Who is connected to which room, per socket.
+
+    Join, leave and disconnect are O(1) per room touched. A user with several
+    tabs open counts once in ``users`` and once per tab in ``sockets``.
+    """
+
+    def __init__(self):
+        self.rooms = {}
+        self.users = {}
+        self.sids = {}
+        self.lock = threading.Lock()
+
+    def join(self, sid, room, user_id, name):
+        with self.lock:
+            members = self.rooms.setdefault(room, {})
+            if sid in members:
+                return False
+            members[sid] = (user_id, name)
+            counts = self.users.setdefault(room, {})
+            counts[user_id] = counts.get(user_id, 0) + 1
+            self.sids.setdefault(sid, set()).add(room)
+            return True
+
+    def leave(self, sid, room):
+        with self.lock:
+            return self._leave(sid, room)
+
+    def disconnect(self, sid):
+        with self.lock:
+            left = []
+            for room in self.sids.pop(sid, set()):
+                member = self._leave(sid, room, keep_sid=True)
+                if member:
+                    left.append((room, member))
+            return left
+
+    def count(self, room):
+        with self.lock:
+            return len(self.users.get(room, ()))
+
+    def counts(self):
+        with self.lock:
+            return {room: len(users) for room, users in self.users.items()}
+
+    def snapshot(self, room, limit=50):
+        with self.lock:
+            members = self.rooms.get(room, {})
+            names = []
+            seen = set()
+            for user_id, name in members.values():
+                if user_id not in seen:
+                    seen.add(user_id)
+                    names.append(name)
+                    if len(names) >= limit:
+                        break
+            return {
+                'room': room,
+                'users': len(self.users.get(room, ())),
+                'sockets': len(members),
+                'members': names,
+            }
+
+    def _leave(self, sid, room, keep_sid=False):
+        members = self.rooms.get(room)
+        if not members or sid not in members:
+            return None
+        user_id, name = members.pop(sid)
+        counts = self.users[room]
+        counts[user_id] -= 1
+        if not counts[user_id]:
+            del counts[user_id]
+        if not members:
+            del self.rooms[room]
+            del self.users[room]
+        if not keep_sid:
+            rooms = self.sids.get(sid)
+            if rooms:
+                rooms.discard(room)
+                if not rooms:
+                    del self.sids[sid]
+        return user_id, name
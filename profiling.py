@@ -0,0 +1,124 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return ';'.join(stack)
+
+
+class ProfileSession:
+    def __init__(self, kind, name, keep):
+        self.kind = kind
+        self.name = name
+        self.keep = keep
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+        self.queries = []
+        self.dropped_queries = 0
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads that opted in and writes slow ones to disk.
+
+    A single background thread wakes every ``interval`` seconds while at least
+    one session is active and records the current stack of each profiled
+    thread. On ``stop`` a session slower than ``slow`` seconds (or started
+    with ``keep=True``) is written as ``<name>.folded`` - collapsed stacks
+    for flamegraph.pl or speedscope - plus a ``<name>.json`` sidecar with the
+    SQL statements it issued.
+    """
+
+    def __init__(self, output_dir, interval=0.005, slow=0.2, max_queries=500):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.slow = slow
+        self.max_queries = max_queries
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.local = threading.local()
+        self.thread = None
+        self.written = 0
+
+    def start(self, kind, name, keep=False):
+        session = ProfileSession(kind, name, keep)
+        with self.lock:
+            self.sessions[session.thread_id] = session
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self.thread.start()
+            self.wake.set()
+        self.local.session = session
+        return session
+
+    def stop(self, session):
+        elapsed = time.perf_counter() - session.started
+        with self.lock:
+            self.sessions.pop(session.thread_id, None)
+        self.local.session = None
+        if session.keep or elapsed >= self.slow:
+            return self._write(session, elapsed)
+        return None
+
+    def record_query(self, statement, seconds):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            return
+        if len(session.queries) < self.max_queries:
+            session.queries.append({'statement': statement, 'ms': round(seconds * 1000, 3)})
+        else:
+            session.dropped_queries += 1
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            with self.lock:
+                active = list(self.sessions.values())
+                if not active:
+                    self.wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for session in active:
+                frame = frames.get(session.thread_id)
+                if frame is not None:
+                    session.stacks[collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _write(self, session, elapsed):
+        os.makedirs(self.output_dir, exist_ok=True)
+        with self.lock:
+            self.written += 1
+            sequence = self.written
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', session.name or 'unknown')
+        base = os.path.join(
+            self.output_dir,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{sequence}-{session.kind}-{name}-{int(elapsed * 1000)}ms"
+        )
+        with open(base + '.folded', 'w') as f:
+            for stack, count in session.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + '.json', 'w') as f:
+            json.dump({
+                'kind': session.kind,
+                'name': session.name,
+                'elapsed_ms': round(elapsed * 1000, 3),
+                'samples': sum(session.stacks.values()),
+                'interval_ms': self.interval * 1000,
+                'sql_ms': round(sum(query['ms'] for query in session.queries), 3),
+                'queries': session.queries,
+                'dropped_queries': session.dropped_queries,
+            }, f, indent=2)
+        return base
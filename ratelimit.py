@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def parse_limits(spec, defaults=None):
+    """Parse ``"message=5:20,login=0.2:5"`` into ``{event: (rate, burst)}``.
+
+    ``rate`` is tokens refilled per second and ``burst`` the bucket size.
+    Entries override ``defaults``; an empty spec returns the defaults.
+    """
+    limits = dict(defaults or {})
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, value = entry.partition('=')
+        rate, _, burst = value.partition(':')
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class MemoryRateLimiter:
+    """Per-process token buckets keyed by (event, key).
+
+    Buckets live in an LRU map capped at ``max_keys`` so one-off clients do
+    not grow memory without bound; an evicted key simply starts full again.
+    """
+
+    def __init__(self, limits, max_keys=100000):
+        self.limits = limits
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self, event, key):
+        limit = self.limits.get(event)
+        if limit is None:
+            return True
+        bucket_key = (event, key)
+        with self.lock:
+            bucket = self.buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self.buckets[bucket_key] = TokenBucket(*limit)
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(bucket_key)
+            allowed = bucket.take()
+            if not allowed:
+                self.rejected += 1
+            return allowed
+
+
+# Refill and take in one round trip; the key expires once the bucket would be full again
+TOKEN_BUCKET_SCRIPT = '''
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return allowed
+'''
+
+
+class RedisRateLimiter:
+    """Token buckets shared by every worker through Redis (needs ``redis``)."""
+
+    def __init__(self, url, limits, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_STORAGE needs the redis package: pip install redis')
+        self.limits = limits
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.rejected = 0
+
+    def allow(self, event, key):
+        limit = self.limits.get(event)
+        if limit is None:
+            return True
+        rate, capacity = limit
+        allowed = self.script(keys=[f'{self.prefix}{event}:{key}'], args=[rate, capacity, time.time()])
+        if not allowed:
+            self.rejected += 1
+        return bool(allowed)
+
+
+def create_rate_limiter(storage, limits):
+    if storage and storage.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisRateLimiter(storage, limits)
+    return MemoryRateLimiter(limits)
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict, deque
+
+# Rough per-entry overhead of a serialized message dict on top of its strings
+ENTRY_OVERHEAD = 400
+
+
+def entry_size(message):
+    return ENTRY_OVERHEAD + sum(len(value) for value in message.values() if isinstance(value, str))
+
+
+class RecentMessages:
+    """Bounded per-room window of the newest serialized messages.
+
+    A room is only served once it has been primed from the database, so the
+    window is always the true tail of the room. Idle rooms are evicted least
+    recently used first when either ``max_rooms`` or ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, per_room=50, max_rooms=1000, max_bytes=32 * 1024 * 1024):
+        self.per_room = per_room
+        self.max_rooms = max_rooms
+        self.max_bytes = max_bytes
+        self.rooms = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, room_code):
+        with self.lock:
+            return room_code in self.rooms
+
+    def get(self, room_code):
+        with self.lock:
+            room = self.rooms.get(room_code)
+            if room is None:
+                self.misses += 1
+                return None
+            self.rooms.move_to_end(room_code)
+            self.hits += 1
+            messages = list(room['messages'])
+            has_older = room['has_older']
+        next_cursor = messages[0]['cursor'] if has_older and messages else None
+        return messages, next_cursor
+
+    def prime(self, room_code, messages, has_older):
+        with self.lock:
+            if room_code in self.rooms:
+                return
+            window = deque(messages[-self.per_room:], maxlen=self.per_room)
+            size = sum(entry_size(message) for message in window)
+            self.rooms[room_code] = {
+                'messages': window,
+                'has_older': has_older or len(messages) > self.per_room,
+                'bytes': size,
+            }
+            self.total_bytes += size
+            self._evict()
+
+    def append(self, room_code, message):
+        with self.lock:
+            room = self.rooms.get(room_code)
+            if room is None:
+                # Cold rooms are primed from the database on next read
+                return
+            window = room['messages']
+            if len(window) == window.maxlen:
+                dropped = entry_size(window[0])
+                room['bytes'] -= dropped
+                self.total_bytes -= dropped
+                room['has_older'] = True
+            window.append(message)
+            size = entry_size(message)
+            room['bytes'] += size
+            self.total_bytes += size
+            self.rooms.move_to_end(room_code)
+            self._evict()
+
+    def discard(self, room_code):
+        with self.lock:
+            room = self.rooms.pop(room_code, None)
+            if room is not None:
+                self.total_bytes -= room['bytes']
+
+    def stats(self):
+        with self.lock:
+            return {
+                'rooms': len(self.rooms),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _evict(self):
+        while self.rooms and (len(self.rooms) > self.max_rooms or self.total_bytes > self.max_bytes):
+            _, room = self.rooms.popitem(last=False)
+            self.total_bytes -= room['bytes']
@@ -0,0 +1,152 @@
+// Chat room client. Page-specific settings come from the CHAT object
+// rendered into chat.html.
+(function() {
+    const socket = io(CHAT.socketOptions);
+    const roomCode = CHAT.room;
+    const messagesDiv = document.getElementById('messages');
+    const loadOlderButton = document.getElementById('loadOlder');
+    const input = document.getElementById('messageInput');
+    let oldestCursor = CHAT.oldestCursor;
+    let newestCursor = CHAT.newestCursor;
+    
+    function scrollToBottom() {
+        messagesDiv.scrollTop = messagesDiv.scrollHeight;
+    }
+    
+    // Built with textContent so message text and names are never parsed as HTML
+    function renderMessage(data) {
+        const div = document.createElement('div');
+        div.className = 'message';
+        
+        const time = document.createElement('small');
+        time.className = 'time';
+        time.textContent = data.timestamp;
+        
+        const username = document.createElement('strong');
+        username.className = 'username';
+        username.textContent = data.username;
+        
+        const code = document.createElement('span');
+        code.className = 'verification-code';
+        code.hidden = true;
+        code.textContent = ` [${data.verification_code}]`;
+        
+        const content = document.createElement('span');
+        content.textContent = data.message;
+        
+        div.append(time, ' ', username, ' ', code, ': ', content);
+        return div;
+    }
+    
+    function renderStatus(data) {
+        const div = document.createElement('div');
+        div.className = 'message status-message';
+        const text = document.createElement('em');
+        text.textContent = data.msg;
+        const time = document.createElement('small');
+        time.textContent = data.timestamp;
+        div.append(text, ' ', time);
+        return div;
+    }
+    
+    // Join room - on reconnects too, replaying anything missed since the newest message shown
+    socket.on('connect', function() {
+        socket.emit('join', {room: roomCode, after: newestCursor});
+    });
+    
+    // Toggle verification code display
+    messagesDiv.addEventListener('click', function(e) {
+        if (e.target.classList.contains('username')) {
+            const codeSpan = e.target.nextElementSibling;
+            codeSpan.hidden = !codeSpan.hidden;
+        }
+    });
+    
+    // Send message
+    function sendMessage() {
+        if (input.value.trim()) {
+            socket.emit('message', {room: roomCode, message: input.value}, function(ack) {
+                if (ack && ack.error === 'rate_limited') {
+                    messagesDiv.appendChild(renderStatus({msg: 'You are sending messages too fast - slow down.', timestamp: ''}));
+                    scrollToBottom();
+                }
+            });
+            input.value = '';
+        }
+    }
+    
+    document.getElementById('sendButton').addEventListener('click', sendMessage);
+    input.addEventListener('keypress', function(e) {
+        if (e.key === 'Enter') sendMessage();
+    });
+    
+    // Handle incoming messages
+    socket.on('message', function(data) {
+        messagesDiv.appendChild(renderMessage(data));
+        newestCursor = data.cursor;
+        scrollToBottom();
+    });
+    
+    // Batched delivery for busy rooms - one DOM append per batch
+    socket.on('messages', function(data) {
+        const fragment = document.createDocumentFragment();
+        data.messages.forEach(function(msg) {
+            fragment.appendChild(renderMessage(msg));
+            newestCursor = msg.cursor;
+        });
+        messagesDiv.appendChild(fragment);
+        scrollToBottom();
+    });
+    
+    // Messages posted while this client was not joined
+    socket.on('replay', function(data) {
+        const fragment = document.createDocumentFragment();
+        data.messages.forEach(function(msg) {
+            fragment.appendChild(renderMessage(msg));
+            newestCursor = msg.cursor;
+        });
+        messagesDiv.appendChild(fragment);
+        scrollToBottom();
+    });
+    
+    // Load older history pages
+    loadOlderButton.addEventListener('click', function() {
+        if (oldestCursor) {
+            loadOlderButton.disabled = true;
+            socket.emit('history', {room: roomCode, before: oldestCursor});
+        }
+    });
+    
+    socket.on('history', function(data) {
+        const fragment = document.createDocumentFragment();
+        data.messages.forEach(function(msg) {
+            fragment.appendChild(renderMessage(msg));
+        });
+        
+        // Keep the viewport anchored while older messages are prepended
+        const previousHeight = messagesDiv.scrollHeight;
+        messagesDiv.insertBefore(fragment, loadOlderButton.nextSibling);
+        messagesDiv.scrollTop += messagesDiv.scrollHeight - previousHeight;
+        
+        oldestCursor = data.next_cursor;
+        loadOlderButton.disabled = false;
+        if (!oldestCursor) loadOlderButton.hidden = true;
+    });
+    
+    // Live member count, sent at most once per interval however busy the room is
+    const presenceBadge = document.getElementById('presence');
+    socket.on('presence', function(data) {
+        presenceBadge.textContent = `👥 ${data.users} online`;
+        presenceBadge.title = data.members.join(', ');
+        presenceBadge.hidden = false;
+    });
+    
+    // Handle status messages
+    socket.on('status', function(data) {
+        messagesDiv.appendChild(renderStatus(data));
+        scrollToBottom();
+    });
+    
+    // Auto-scroll to bottom
+    scrollToBottom();
+})();
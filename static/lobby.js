@@ -0,0 +1,10 @@
+// Fill in live occupancy badges on the (cached) room cards
+(function() {
+    document.querySelectorAll('.occupancy').forEach(function(badge) {
+        const count = OCCUPANCY[badge.dataset.room];
+        if (count) {
+            badge.textContent = `👥 ${count}`;
+            badge.hidden = false;
+        }
+    });
+})();
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py configures itself from the environment at import time. Tests get a
+# scratch SQLite file unless DATABASE_URL already points at a server database.
+SCRATCH = tempfile.mkdtemp(prefix='chat-test-')
+if os.environ.get('DATABASE_URL', 'sqlite').startswith('sqlite'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH, 'test.db')
+os.environ.setdefault('ARCHIVE_DIR', os.path.join(SCRATCH, 'archive'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('MESSAGE_WRITE_BEHIND', '0')
+os.environ.setdefault('TRUSTED_PROXIES', '1')
+os.environ.setdefault('RATE_LIMITS', 'message=1e9:1e9,join=1e9:1e9,history=1e9:1e9,create_room=1e9:1e9,login=1e9:1e9')
+
+import app as chat
+
+
+@pytest.fixture
+def client():
+    client = chat.app.test_client()
+    response = client.post('/login', data={'email': 'admin@chat.com', 'password': 'admin123'})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def room():
+    with chat.app.app_context():
+        code = chat.add_with_code(
+            lambda code: chat.ChatRoom(code=code, name='test room', category='custom', is_public=False, created_by=1),
+            'code',
+            chat.ROOM_CODE_LENGTH
+        ).code
+        chat.db.session.commit()
+    yield code
+    with chat.app.app_context():
+        chat.Message.query.filter_by(room_code=code).delete()
+        chat.ChatRoom.query.filter_by(code=code).delete()
+        chat.db.session.commit()
+    if chat.recent_messages:
+        chat.recent_messages.discard(code)
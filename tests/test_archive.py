@@ -0,0 +1,124 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as chat
+from archive import ArchiveStore
+
+START = datetime(2024, 1, 1)
+
+
+def make_rows(count, first_id=1):
+    return [{
+        'id': first_id + i,
+        'content': f'message {first_id + i}',
+        'user_id': 1,
+        'username': 'admin',
+        'verification_code': 'ADMIN001',
+        'timestamp': (START + timedelta(hours=first_id + i)).isoformat()
+    } for i in range(count)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    for first_id in range(1, 1001, 100):
+        store.append('ROOM', make_rows(100, first_id))
+    return store
+
+
+def test_page_reads_only_the_segments_it_needs(store, monkeypatch):
+    reads = []
+    read = store.read
+    monkeypatch.setattr(store, 'read', lambda *args: reads.append(args) or read(*args))
+
+    rows, has_more = store.page('ROOM', limit=50)
+    assert [row['id'] for row in rows] == list(range(951, 1001))
+    assert has_more
+    assert len(reads) == 1
+
+    before = datetime.fromisoformat(rows[0]['timestamp']), rows[0]['id']
+    rows, has_more = store.page('ROOM', before, limit=120)
+    assert [row['id'] for row in rows] == list(range(831, 951))
+    assert has_more
+    assert len(reads) == 3
+
+
+def test_page_at_the_start_of_the_archive(store):
+    rows, has_more = store.page('ROOM', (START + timedelta(hours=11), 11), limit=50)
+    assert [row['id'] for row in rows] == list(range(1, 11))
+    assert not has_more
+
+
+def test_batches_split_by_month(store):
+    assert store.months('ROOM') == ['2024-01', '2024-02']
+    assert [row['id'] for row in store.iter_rows('ROOM')] == list(range(1, 1001))
+
+
+def test_rearchived_batch_replaces_the_first_copy(store):
+    # A compaction that crashed after writing but before deleting runs again
+    store.append('ROOM', make_rows(100, 901))
+    store.append('ROOM', make_rows(60, 901))
+    ids = [row['id'] for row in store.iter_rows('ROOM')]
+    assert ids == list(range(1, 961))
+
+
+def test_no_partial_segments_are_left_behind(store):
+    rows = make_rows(10, 2001)
+    rows[5]['content'] = object()
+    with pytest.raises(TypeError):
+        store.append('ROOM', rows)
+    assert [row['id'] for row in store.iter_rows('ROOM')] == list(range(1, 1001))
+    assert os.listdir(os.path.join(store.room_dir('ROOM'), '2024-03')) == []
+
+
+def test_writer_lock_is_exclusive(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    with store.writer() as first:
+        with ArchiveStore(str(tmp_path)).writer() as second:
+            assert first and not second
+    with store.writer() as again:
+        assert again
+
+
+def test_compaction_moves_rows_into_history(client, room, monkeypatch):
+    monkeypatch.setitem(chat.RETENTION_POLICY, room, 30)
+    now = datetime.utcnow()
+    with chat.app.app_context():
+        for i in range(30):
+            chat.db.session.add(chat.Message(content=f'old {i}', user_id=1, room_code=room,
+                                             timestamp=now - timedelta(days=90, minutes=-i)))
+        for i in range(5):
+            chat.db.session.add(chat.Message(content=f'new {i}', user_id=1, room_code=room,
+                                             timestamp=now - timedelta(minutes=10 - i)))
+        chat.db.session.commit()
+        moved, _ = chat.compact_messages(now)
+        assert moved == {room: 30}
+        assert chat.Message.query.filter_by(room_code=room).count() == 5
+
+    page = client.get(f'/chat/{room}/history', query_string={'limit': 20}).get_json()
+    seen = [msg['message'] for msg in page['messages']]
+    while page['next_cursor']:
+        page = client.get(f'/chat/{room}/history', query_string={'limit': 7, 'before': page['next_cursor']}).get_json()
+        seen = [msg['message'] for msg in page['messages']] + seen
+    assert seen == [f'old {i}' for i in range(30)] + [f'new {i}' for i in range(5)]
+
+
+def test_compaction_skips_while_another_process_compacts():
+    with ArchiveStore(chat.ARCHIVE_DIR).writer() as held:
+        assert held
+        with chat.app.app_context():
+            assert chat.compact_messages() is None
+        result = chat.app.test_cli_runner().invoke(args=['compact'])
+    assert result.exit_code != 0
+    assert 'another process is compacting' in result.output
+
+
+def test_iter_rows_skips_overlapping_copies(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    store.append('ROOM', make_rows(100, 1))
+    # Segments named after different first rows but covering the same ones
+    store.append('ROOM', make_rows(100, 51))
+    store.append('ROOM', make_rows(20, 141))
+    assert [row['id'] for row in store.iter_rows('ROOM')] == list(range(1, 161))
@@ -0,0 +1,25 @@
+import pytest
+
+import app as chat
+
+
+def asset_path(name):
+    with chat.app.test_request_context():
+        return chat.app.jinja_env.globals['asset_url'](name)
+
+
+@pytest.mark.parametrize('name', ['style.css', 'lobby.js'])
+def test_assets_have_one_charset(name):
+    response = chat.app.test_client().get(asset_path(name))
+    assert response.status_code == 200
+    # text/javascript or application/javascript, depending on the platform
+    assert response.headers['Content-Type'].endswith('; charset=utf-8')
+    assert response.headers['Content-Type'].count('charset') == 1
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+
+def test_conditional_request_gets_304():
+    client = chat.app.test_client()
+    path = asset_path('style.css')
+    etag = client.get(path).headers['ETag']
+    assert client.get(path, headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,95 @@
+import threading
+import time
+import uuid
+
+import pytest
+import socketio
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from werkzeug.serving import make_server
+
+from backplane import LocalManager
+
+# The Socket.IO client needs requests for the polling transport
+pytest.importorskip('requests')
+
+
+class Worker:
+    """One Flask-SocketIO server on its own port, like a gunicorn worker."""
+
+    def __init__(self, channel):
+        self.app = Flask(__name__)
+        self.socketio = SocketIO(self.app, async_mode='threading',
+                                 client_manager=LocalManager('local://', channel=channel))
+
+        @self.socketio.on('join')
+        def join(room):
+            join_room(room)
+            return 'joined'
+
+        @self.socketio.on('say')
+        def say(data):
+            self.socketio.emit('message', data['text'], to=data['room'])
+
+        self.server = make_server('127.0.0.1', 0, self.app, threaded=True)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.socketio.server.manager.close()
+
+
+class Listener:
+    def __init__(self, worker, room=None):
+        self.messages = []
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('message', self.messages.append)
+        self.client.connect(worker.url, transports=['polling'])
+        if room:
+            assert self.client.call('join', room, timeout=5) == 'joined'
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.messages and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.messages
+
+
+@pytest.fixture
+def workers():
+    channel = f'test-{uuid.uuid4().hex}'
+    started = [Worker(channel), Worker(channel)]
+    yield started
+    for worker in started:
+        worker.stop()
+
+
+def test_room_emit_reaches_a_client_on_another_worker(workers):
+    first, second = workers
+    sender = Listener(first, 'lobby')
+    listener = Listener(second, 'lobby')
+    outsider = Listener(second)
+    try:
+        sender.client.emit('say', {'room': 'lobby', 'text': 'hello from worker one'})
+        assert listener.wait(5) == ['hello from worker one']
+        assert sender.wait(5) == ['hello from worker one']
+        assert outsider.wait(0.3) == []
+    finally:
+        for client in (sender, listener, outsider):
+            client.client.disconnect()
+
+
+def test_channels_are_isolated():
+    first, second = Worker(f'test-{uuid.uuid4().hex}'), Worker(f'test-{uuid.uuid4().hex}')
+    sender = Listener(first, 'lobby')
+    listener = Listener(second, 'lobby')
+    try:
+        sender.client.emit('say', {'room': 'lobby', 'text': 'not for you'})
+        assert sender.wait(5) == ['not for you']
+        assert listener.wait(0.3) == []
+    finally:
+        sender.client.disconnect()
+        listener.client.disconnect()
+        first.stop()
+        second.stop()
@@ -0,0 +1,50 @@
+import app as chat
+
+
+def test_lobby_is_cleared_on_commit(room):
+    with chat.app.app_context():
+        codes = chat.public_room_codes()
+        chat.ChatRoom.query.filter_by(code=room).first().is_public = True
+        chat.db.session.flush()
+        # Still the committed rooms: clearing here would let a concurrent
+        # request cache them again, and keep them past the commit
+        assert chat.lobby_cache.get('codes') is codes
+        chat.db.session.commit()
+        assert room in chat.public_room_codes()
+
+
+def test_lobby_rollback_keeps_cache(room):
+    with chat.app.app_context():
+        codes = chat.public_room_codes()
+        chat.ChatRoom.query.filter_by(code=room).first().is_public = True
+        chat.db.session.flush()
+        chat.db.session.rollback()
+        assert 'lobby_stale' not in chat.db.session.info
+        assert chat.public_room_codes() is codes
+
+
+def test_user_leaves_cache_on_commit():
+    with chat.app.app_context():
+        cached = chat.load_user(1)
+        admin = chat.db.session.get(chat.User, 1)
+        name = admin.name
+        try:
+            admin.name = 'renamed admin'
+            chat.db.session.flush()
+            assert chat.user_cache.get(1) is cached
+            chat.db.session.commit()
+            assert chat.load_user(1).name == 'renamed admin'
+        finally:
+            admin.name = name
+            chat.db.session.commit()
+        assert chat.load_user(1).name == name
+
+
+def test_user_rollback_keeps_cache():
+    with chat.app.app_context():
+        cached = chat.load_user(1)
+        chat.db.session.get(chat.User, 1).name = 'renamed admin'
+        chat.db.session.flush()
+        chat.db.session.rollback()
+        assert 'stale_users' not in chat.db.session.info
+        assert chat.load_user(1) is cached
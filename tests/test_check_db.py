@@ -0,0 +1,68 @@
+import os
+import shutil
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+import app as chat
+
+CHECK_ARGS = ['check-db', '--writers', '4', '--messages', '50']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope='module')
+def launched_postgres(tmp_path_factory):
+    """A throwaway PostgreSQL server: pgserver's bundled binaries when that
+    package is installed, else initdb/pg_ctl from PATH."""
+    pytest.importorskip('psycopg2', reason='needs pip install psycopg2-binary')
+    data_dir = tmp_path_factory.mktemp('postgres')
+    try:
+        import pgserver
+    except ImportError:
+        pgserver = None
+
+    # Name the driver: SQLAlchemy 2.1 defaults postgresql:// to psycopg 3
+    if pgserver:
+        server = pgserver.get_server(str(data_dir), cleanup_mode='stop')
+        yield server.get_uri().replace('postgresql://', 'postgresql+psycopg2://', 1)
+        server.cleanup()
+        return
+
+    if not (shutil.which('initdb') and shutil.which('pg_ctl')):
+        pytest.skip('no PostgreSQL to launch: pip install pgserver, or put initdb/pg_ctl on PATH')
+    port = free_port()
+    subprocess.run(['initdb', '-D', str(data_dir), '-U', 'postgres', '--auth=trust'], check=True, capture_output=True)
+    subprocess.run([
+        'pg_ctl', '-D', str(data_dir), '-w', '-l', str(data_dir / 'server.log'),
+        '-o', f'-p {port} -k {data_dir} -c listen_addresses=127.0.0.1', 'start'
+    ], check=True, capture_output=True)
+    yield f'postgresql+psycopg2://postgres@127.0.0.1:{port}/postgres'
+    subprocess.run(['pg_ctl', '-D', str(data_dir), '-m', 'fast', 'stop'], capture_output=True)
+
+
+@pytest.mark.skipif(os.environ['DATABASE_URL'].startswith('sqlite'),
+                    reason='DATABASE_URL is not a server database')
+def test_check_db_on_configured_server():
+    result = chat.app.test_cli_runner().invoke(args=CHECK_ARGS)
+    assert result.exit_code == 0, result.output
+    assert 'database check passed' in result.output
+    assert f'backend: {chat.db.engine.dialect.name}' in result.output
+
+
+def test_check_db_on_launched_postgres(launched_postgres, tmp_path):
+    # A fresh process, so the app boots (schema, migrations, seeding) on PostgreSQL too
+    env = dict(os.environ, DATABASE_URL=launched_postgres, ARCHIVE_DIR=str(tmp_path / 'archive'))
+    result = subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', *CHECK_ARGS],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert 'backend: postgresql' in result.stdout
+    assert 'database check passed' in result.stdout
@@ -0,0 +1,52 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as chat
+
+
+@pytest.fixture
+def archived_room(room, monkeypatch):
+    monkeypatch.setitem(chat.RETENTION_POLICY, room, 30)
+    monkeypatch.setattr(chat, 'EXPORT_CHUNK_SIZE', 256)
+    now = datetime.utcnow()
+    with chat.app.app_context():
+        for i in range(40):
+            chat.db.session.add(chat.Message(content=f'old "{i}", quoted', user_id=1, room_code=room,
+                                             timestamp=now - timedelta(days=60, minutes=-i)))
+        for i in range(25):
+            chat.db.session.add(chat.Message(content=f'new {i}', user_id=1, room_code=room,
+                                             timestamp=now - timedelta(minutes=30 - i)))
+        chat.db.session.commit()
+        chat.compact_messages(now)
+    return room
+
+
+def expected_messages():
+    return [f'old "{i}", quoted' for i in range(40)] + [f'new {i}' for i in range(25)]
+
+
+def test_ndjson_export_covers_archive_and_live_rows(client, archived_room, monkeypatch):
+    monkeypatch.setattr(chat, 'EXPORT_BATCH_SIZE', 10)
+    response = client.get(f'/chat/{archived_room}/export', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    rows = [json.loads(line) for line in gzip.decompress(response.data).decode().splitlines()]
+    assert [row['message'] for row in rows] == expected_messages()
+    assert len({row['id'] for row in rows}) == len(rows)
+
+
+def test_csv_export(client, archived_room):
+    response = client.get(f'/chat/{archived_room}/export', query_string={'format': 'csv'})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert list(rows[0]) == chat.EXPORT_FIELDS
+    assert [row['message'] for row in rows] == expected_messages()
+
+
+def test_unknown_format_is_rejected(client, room):
+    assert client.get(f'/chat/{room}/export', query_string={'format': 'xml'}).status_code == 400
@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+import app as chat
+from hashing import HasherBusy, PasswordHasher
+
+
+def test_hash_and_check():
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1, max_pending=0)
+    pwhash = hasher.hash('secret')
+    assert hasher.check(pwhash, 'secret')
+    assert not hasher.check(pwhash, 'wrong')
+    assert hasher.stats() == {'in_flight': 0, 'completed': 3, 'rejected': 0}
+
+
+def test_full_pool_is_rejected_at_once():
+    hasher = PasswordHasher(workers=1, max_pending=1, timeout=5)
+    release = threading.Event()
+    # One call runs on the worker, the other waits in the queue
+    callers = [threading.Thread(target=hasher._run, args=(release.wait,)) for _ in range(2)]
+    for caller in callers:
+        caller.start()
+    try:
+        deadline = time.monotonic() + 5
+        while hasher.stats()['in_flight'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        with pytest.raises(HasherBusy):
+            hasher._run(lambda: None)
+    finally:
+        release.set()
+        for caller in callers:
+            caller.join()
+    assert hasher.stats() == {'in_flight': 0, 'completed': 2, 'rejected': 1}
+
+
+def test_slow_hash_times_out():
+    hasher = PasswordHasher(workers=1, max_pending=0, timeout=0.05)
+    release = threading.Event()
+    with pytest.raises(HasherBusy):
+        hasher._run(release.wait)
+    release.set()
+
+
+def test_default_pool_leaves_a_request_thread_free():
+    assert chat.PASSWORD_HASH_WORKERS + chat.PASSWORD_HASH_QUEUE < chat.REQUEST_THREADS
@@ -0,0 +1,104 @@
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+import app as chat
+
+AUTHORS = 5
+MESSAGES = 500
+# load_user (at most once), the room lookup and one history SELECT
+MAX_QUERIES = 4
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with chat.app.app_context():
+        engine = chat.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def busy_room(room):
+    with chat.app.app_context():
+        authors = []
+        for i in range(AUTHORS):
+            authors.append(chat.add_with_code(lambda code: chat.User(
+                name=f'author {i}',
+                email=f'author{i}-{room}@example.com',
+                password='x',
+                verification_code=code
+            ), 'verification_code', chat.VERIFICATION_CODE_LENGTH))
+        chat.db.session.commit()
+        author_ids = [author.id for author in authors]
+
+        started = datetime.utcnow() - timedelta(hours=1)
+        chat.db.session.execute(insert(chat.Message), [{
+            'content': f'message {i}',
+            'user_id': author_ids[i % AUTHORS],
+            'room_code': room,
+            'timestamp': started + timedelta(seconds=i)
+        } for i in range(MESSAGES)])
+        chat.db.session.commit()
+    yield room
+    with chat.app.app_context():
+        chat.Message.query.filter_by(room_code=room).delete()
+        chat.User.query.filter(chat.User.id.in_(author_ids)).delete()
+        chat.db.session.commit()
+
+
+def test_chat_page_query_count_is_constant(client, busy_room):
+    with count_queries() as statements:
+        response = client.get(f'/chat/{busy_room}')
+    assert response.status_code == 200
+    assert b'message 499' in response.data
+    assert len(statements) <= MAX_QUERIES, statements
+
+
+def test_history_page_query_count_is_constant(client, busy_room):
+    first = client.get(f'/chat/{busy_room}/history', query_string={'limit': 100}).get_json()
+    assert len(first['messages']) == 100
+    assert first['next_cursor']
+
+    with count_queries() as statements:
+        response = client.get(f'/chat/{busy_room}/history', query_string={'limit': 200, 'before': first['next_cursor']})
+    page = response.get_json()
+    assert [msg['message'] for msg in page['messages']] == [f'message {i}' for i in range(200, 400)]
+    assert {msg['username'] for msg in page['messages']} == {f'author {i}' for i in range(AUTHORS)}
+    assert len(statements) <= MAX_QUERIES, statements
+
+
+@pytest.fixture
+def local_timezone(monkeypatch):
+    # Far enough from UTC that a local clock shows a different hour
+    monkeypatch.setenv('TZ', 'Pacific/Kiritimati')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_live_message_matches_history_timestamp(client, room, local_timezone):
+    socket = chat.socketio.test_client(chat.app, flask_test_client=client)
+    socket.emit('join', {'room': room})
+    socket.get_received()
+    socket.emit('message', {'room': room, 'message': 'hello'})
+    live = [event for event in socket.get_received() if event['name'] == 'message'][0]['args']
+    socket.disconnect()
+
+    if chat.recent_messages:
+        chat.recent_messages.discard(room)
+    stored = client.get(f'/chat/{room}/history').get_json()['messages'][-1]
+    assert stored['message'] == 'hello'
+    assert live['timestamp'] == stored['timestamp']
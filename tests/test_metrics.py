@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import app as chat
+
+
+def test_metrics_exposition(client):
+    client.get('/lobby')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'http_requests_total{endpoint="lobby",method="GET",status="200"}' in body
+    assert 'db_queries_total{route="lobby"}' in body
+    assert '# TYPE http_request_duration_seconds histogram' in body
+
+
+def test_private_rooms_are_not_labelled(client, room):
+    socket = chat.socketio.test_client(chat.app, flask_test_client=client)
+    socket.emit('join', {'room': room})
+    try:
+        body = client.get('/metrics').get_data(as_text=True)
+    finally:
+        socket.disconnect()
+    assert 'socketio_connected_sockets' in body
+    assert room not in body
+
+
+@pytest.mark.parametrize('path', ['/metrics', '/metrics/persistence', '/metrics/recent'])
+def test_metrics_refuse_remote_clients(path):
+    client = chat.app.test_client()
+    assert client.get(path).status_code == 200
+    assert client.get(path, headers={'X-Forwarded-For': '203.0.113.7'}).status_code == 403
+
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.setattr(chat, 'METRICS_TOKEN', 'scrape-me')
+    client = chat.app.test_client()
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me', 'X-Forwarded-For': '203.0.113.7'})
+    assert response.status_code == 200
+
+
+def test_failed_statement_leaves_no_timer_behind():
+    with chat.app.app_context():
+        with chat.db.engine.connect() as conn:
+            counted = chat.db_queries.values.get(('background',), 0)
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.execute(text('SELECT * FROM no_such_table'))
+            conn.execute(text('SELECT 1'))
+            assert conn.info == {}
+            assert chat.db_queries.values[('background',)] == counted + 1
+
+
+def test_each_connect_is_counted_once(client):
+    before = chat.socket_events.values.get(('connect',), 0)
+    socket = chat.socketio.test_client(chat.app, flask_test_client=client)
+    assert socket.is_connected()
+    socket.disconnect()
+    assert chat.socket_events.values[('connect',)] == before + 1
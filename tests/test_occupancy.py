@@ -0,0 +1,40 @@
+import app as chat
+
+
+def public_room():
+    with chat.app.app_context():
+        return chat.ChatRoom.query.filter_by(is_public=True).first().code
+
+
+def test_occupancy_lists_public_rooms_only(client, room):
+    lobby_room = public_room()
+    socket = chat.socketio.test_client(chat.app, flask_test_client=client)
+    socket.emit('join', {'room': room})
+    socket.emit('join', {'room': lobby_room})
+    try:
+        occupancy = client.get('/rooms/occupancy').get_json()
+        assert occupancy.get(lobby_room) == 1
+        assert room not in occupancy
+
+        lobby = client.get('/lobby').get_data(as_text=True)
+        assert lobby_room in lobby
+        assert room not in lobby
+    finally:
+        socket.disconnect()
+
+
+def test_room_made_private_leaves_occupancy(client, room):
+    socket = chat.socketio.test_client(chat.app, flask_test_client=client)
+    socket.emit('join', {'room': room})
+    try:
+        with chat.app.app_context():
+            chat.ChatRoom.query.filter_by(code=room).first().is_public = True
+            chat.db.session.commit()
+        assert room in client.get('/rooms/occupancy').get_json()
+
+        with chat.app.app_context():
+            chat.ChatRoom.query.filter_by(code=room).first().is_public = False
+            chat.db.session.commit()
+        assert room not in client.get('/rooms/occupancy').get_json()
+    finally:
+        socket.disconnect()
@@ -0,0 +1,49 @@
+import sqlite3
+
+from persistence import WriteBehindQueue
+
+
+class FlakyFlush:
+    def __init__(self, failures):
+        self.failures = failures
+        self.written = []
+
+    def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        self.written.extend(rows)
+
+
+def test_transient_failure_is_retried():
+    flush = FlakyFlush(failures=2)
+    writer = WriteBehindQueue(flush, max_retries=3, backoff=0.001)
+    writer._flush([1, 2, 3])
+    assert flush.written == [1, 2, 3]
+    stats = writer.stats()
+    assert (stats['rows_written'], stats['rows_failed'], stats['retries']) == (3, 0, 2)
+
+
+def test_rows_fail_only_after_last_retry():
+    flush = FlakyFlush(failures=10)
+    writer = WriteBehindQueue(flush, max_retries=2, backoff=0.001)
+    writer._flush([1, 2, 3])
+    assert flush.written == []
+    stats = writer.stats()
+    assert (stats['rows_written'], stats['rows_failed'], stats['retries']) == (0, 3, 2)
+
+
+def test_settled_rows_are_not_retried():
+    attempts = []
+
+    def flush(rows):
+        attempts.append(list(rows))
+        if len(attempts) == 1:
+            # Commits the first row, then the database goes away
+            rows.pop(0)
+            raise sqlite3.OperationalError('database is locked')
+
+    writer = WriteBehindQueue(flush, max_retries=1, backoff=0.001)
+    writer._flush([1, 2, 3])
+    assert attempts == [[1, 2, 3], [2, 3]]
+    assert writer.stats()['rows_written'] == 3
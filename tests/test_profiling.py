@@ -0,0 +1,69 @@
+import json
+import time
+
+import pytest
+
+import app as chat
+from profiling import SamplingProfiler
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_kept_session_is_written(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path), interval=0.001, slow=10, max_queries=2)
+    session = profiler.start('http', 'chat/room', keep=True)
+    busy_wait(0.1)
+    for i in range(3):
+        profiler.record_query(f'SELECT {i}', 0.002)
+    base = profiler.stop(session)
+
+    assert base.endswith('ms') and '-http-chat_room-' in base
+    with open(base + '.folded') as f:
+        stacks = f.read().splitlines()
+    assert any('busy_wait (test_profiling.py' in line for line in stacks)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in stacks)
+
+    with open(base + '.json') as f:
+        summary = json.load(f)
+    assert summary['samples'] > 0
+    assert [query['statement'] for query in summary['queries']] == ['SELECT 0', 'SELECT 1']
+    assert summary['dropped_queries'] == 1
+    assert summary['sql_ms'] == 4.0
+
+
+def test_fast_session_is_discarded(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path), interval=0.001, slow=10)
+    session = profiler.start('socket', 'message')
+    assert profiler.stop(session) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_queries_outside_a_session_are_ignored(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path))
+    profiler.record_query('SELECT 1', 0.001)
+    assert profiler.written == 0
+
+
+@pytest.fixture
+def header_profiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat, 'PROFILE_MODE', 'header')
+    monkeypatch.setattr(chat, 'PROFILE_TOKEN', 'let-me-profile')
+    monkeypatch.setattr(chat, 'profiler', SamplingProfiler(str(tmp_path), interval=0.001))
+    return tmp_path
+
+
+def test_profile_header_writes_a_profile(header_profiling):
+    response = chat.app.test_client().get('/', headers={'X-Profile': 'let-me-profile'})
+    assert response.status_code == 200
+    assert sorted(path.suffix for path in header_profiling.iterdir()) == ['.folded', '.json']
+
+
+@pytest.mark.parametrize('token', ['wrong', 'é'])
+def test_other_profile_headers_are_ignored(header_profiling, token):
+    response = chat.app.test_client().get('/', headers={'X-Profile': token})
+    assert response.status_code == 200
+    assert list(header_profiling.iterdir()) == []
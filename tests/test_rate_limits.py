@@ -0,0 +1,29 @@
+import app as chat
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.keys = []
+
+    def allow(self, name, key):
+        self.keys.append((name, key))
+        return True
+
+
+def test_login_is_limited_per_forwarded_client(monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(chat, 'rate_limiter', limiter)
+    client = chat.app.test_client()
+    for address in ('203.0.113.7', '198.51.100.23'):
+        client.post('/login', data={'email': 'nobody@example.com', 'password': 'x'},
+                    headers={'X-Forwarded-For': address})
+    assert limiter.keys == [('login', '203.0.113.7'), ('login', '198.51.100.23')]
+
+
+def test_only_the_trusted_hop_is_believed(monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(chat, 'rate_limiter', limiter)
+    # A client-supplied X-Forwarded-For is kept by nginx in front of the real address
+    chat.app.test_client().post('/login', data={'email': 'nobody@example.com', 'password': 'x'},
+                                headers={'X-Forwarded-For': '10.0.0.1, 203.0.113.7'})
+    assert limiter.keys == [('login', '203.0.113.7')]
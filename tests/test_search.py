@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+import app as chat
+
+
+def add_messages(room_code, contents):
+    started = datetime.utcnow() - timedelta(hours=1)
+    with chat.app.app_context():
+        chat.db.session.execute(insert(chat.Message), [{
+            'content': content,
+            'user_id': 1,
+            'room_code': room_code,
+            'timestamp': started + timedelta(seconds=i)
+        } for i, content in enumerate(contents)])
+        chat.db.session.commit()
+
+
+@pytest.fixture
+def other_room():
+    with chat.app.app_context():
+        code = chat.add_with_code(
+            lambda code: chat.ChatRoom(code=code, name='other room', category='custom', is_public=False, created_by=1),
+            'code',
+            chat.ROOM_CODE_LENGTH
+        ).code
+        chat.db.session.commit()
+    yield code
+    with chat.app.app_context():
+        chat.Message.query.filter_by(room_code=code).delete()
+        chat.ChatRoom.query.filter_by(code=code).delete()
+        chat.db.session.commit()
+
+
+def search(client, room_code, q, **params):
+    response = client.get(f'/chat/{room_code}/search', query_string={'q': q, **params})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_search_is_scoped_to_the_room(client, room, other_room):
+    add_messages(room, ['launch party tonight', 'nothing here'])
+    add_messages(other_room, ['launch party elsewhere'])
+    results = search(client, room, 'launch party')['results']
+    assert [result['message'] for result in results] == ['launch party tonight']
+
+
+def test_last_term_matches_as_prefix(client, room):
+    add_messages(room, ['deployment finished', 'deploy now', 'redeploy later'])
+    found = {result['message'] for result in search(client, room, 'deplo')['results']}
+    assert found == {'deployment finished', 'deploy now'}
+    # Only the last term is a prefix
+    assert search(client, room, 'deplo now')['results'] == []
+
+
+def test_pages_survive_inserts_between_requests(client, room, other_room):
+    # Varying lengths and term counts, so bm25 scores really differ
+    add_messages(room, [f'needle {"needle " * (i % 4)}{"hay " * (i % 7)}{i}' for i in range(60)])
+    with chat.app.app_context():
+        expected = {msg.id for msg in chat.Message.query.filter_by(room_code=room)}
+
+    page = search(client, room, 'needle', limit=20)
+    seen = [result['id'] for result in page['results']]
+    while page['next_cursor']:
+        # Every insert shifts bm25 statistics for the whole table
+        add_messages(other_room, [f'needle {"filler " * (i % 9)}' for i in range(500)])
+        add_messages(room, ['needle sent after the first page'])
+        page = search(client, room, 'needle', limit=20, cursor=page['next_cursor'])
+        seen += [result['id'] for result in page['results']]
+    assert len(seen) == 60
+    assert set(seen) == expected
+
+
+def test_results_are_ranked(client, room):
+    add_messages(room, ['alpha beta gamma delta epsilon zeta eta theta rust', 'rust rust rust'])
+    results = search(client, room, 'rust')['results']
+    assert [result['message'] for result in results] == ['rust rust rust', 'alpha beta gamma delta epsilon zeta eta theta rust']
+
+
+def test_result_count_is_bounded(client, room, monkeypatch):
+    monkeypatch.setattr(chat, 'SEARCH_MAX_RESULTS', 25)
+    add_messages(room, [f'bounded {i}' for i in range(40)])
+    page = search(client, room, 'bounded', limit=20)
+    page = search(client, room, 'bounded', limit=20, cursor=page['next_cursor'])
+    assert len(page['results']) == 5
+    assert page['next_cursor'] is None
+
+
+def test_invalid_cursor(client, room):
+    response = client.get(f'/chat/{room}/search', query_string={'q': 'x', 'cursor': 'garbage'})
+    assert response.status_code == 400
+
+
+def test_like_search_pages_newest_first(room):
+    add_messages(room, [f'Report_{i} done' if i % 2 else f'other {i}' for i in range(30)] + ['report-x'])
+    with chat.app.app_context():
+        seen, cursor = [], None
+        while True:
+            page, next_cursor = chat.like_search(room, ['report_'], chat.decode_cursor(cursor) if cursor else None, limit=4)
+            seen += [msg.content for msg in page]
+            if not next_cursor:
+                break
+            cursor = next_cursor
+    # Case-insensitive, and "_" is literal rather than a wildcard
+    assert seen == [f'Report_{i} done' for i in range(29, 0, -2)]
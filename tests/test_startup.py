@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+import app as chat
+
+WORKERS = 4
+
+# What each gunicorn worker does on boot
+BOOT = "import app"
+
+CHECK = (
+    "import app\n"
+    "with app.app.app_context():\n"
+    "    print(app.User.query.count(), app.ChatRoom.query.filter_by(is_public=True).count())\n"
+)
+
+
+def test_workers_booting_together_share_one_setup(tmp_path):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': 'sqlite:///' + str(tmp_path / 'fresh.db'),
+        'ARCHIVE_DIR': str(tmp_path / 'archive'),
+    })
+    workers = [
+        subprocess.Popen([sys.executable, '-c', BOOT], cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        for _ in range(WORKERS)
+    ]
+    for worker in workers:
+        output, _ = worker.communicate(timeout=60)
+        assert worker.returncode == 0, output.decode()
+
+    output = subprocess.run([sys.executable, '-c', CHECK], cwd=ROOT, env=env, capture_output=True, check=True).stdout
+    users, public_rooms = map(int, output.split())
+    assert users == 1
+    assert public_rooms == sum(len(rooms) for rooms in chat.PUBLIC_ROOMS.values())